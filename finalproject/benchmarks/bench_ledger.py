@@ -0,0 +1,76 @@
+"""
+Memory per transaction: list of dicts (csv.DictReader rows), list of Transaction
+objects and the column-stored entities.Ledger with its secondary indexes built (as
+TransactionService keeps it), split into columns and indexes
+
+Usage: python benchmarks/bench_ledger.py [<rows>]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_reader import write_ledger  # noqa: E402
+from business_logic import entities, services  # noqa: E402
+from data_access import repositories  # noqa: E402
+
+
+def load_dicts(service):
+    return list(service.readall())
+
+
+def load_objects(service):
+    return [
+        entities.Transaction(**transaction) for transaction in service.readall()
+    ]
+
+
+def load_ledger(service):
+    return service.load_ledger()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as folder:
+        repository = repositories.TransactionRepository()
+        repository.file_path = os.path.join(folder, "transactions.csv")
+        write_ledger(repository.file_path, rows)
+        service = services.TransactionService(repository)
+
+        for name, load in [
+            ("dicts", load_dicts),
+            ("Transaction", load_objects),
+            ("Ledger", load_ledger),
+        ]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            loaded = load(service)
+            seconds = time.perf_counter() - start
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            print(f"{name:<12} {seconds:8.3f}s  {size / rows:8.1f} bytes/transaction")
+            del loaded
+
+        ledger = service.ledger
+        total = ledger.memory_usage()
+        indexes = ledger.index_usage()
+        print(
+            f"{'  columns':<12} {'':>9} {(total - indexes) / rows:8.1f} "
+            "bytes/transaction"
+        )
+        print(f"{'  indexes':<12} {'':>9} {indexes / rows:8.1f} bytes/transaction")
+
+        assert len(ledger) == rows
+        assert ledger.row(ledger.find(f"{rows:09d}"))["id"] == f"{rows:09d}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare the csv.DictReader path with the typed record reader
+
+Usage: python benchmarks/bench_reader.py [<rows>]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from business_logic import services  # noqa: E402
+from data_access import repositories  # noqa: E402
+
+CATEGORIES = ["food", "transportation", "clothes", "medical", "education"]
+
+
+def write_ledger(path, rows):
+    with open(path, "w", newline="") as file:
+        file.write(",".join(repositories.TransactionRepository.FIELDNAMES) + "\r\n")
+        for id in range(1, rows + 1):
+            file.write(
+                f"{id:09d},{random.choice(['income', 'expense'])},"
+                f"{random.randint(1, 100000)},"
+                f"2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} 12:00:00,"
+                f"{random.choice(CATEGORIES)},\r\n"
+            )
+
+
+def dict_reader(service):
+    total = 0
+    for transaction in service.readall():
+        if transaction["type"] == "expense":
+            total += int(transaction["amount"])
+    return total
+
+
+def record_reader(service):
+    total = 0
+    for batch in service.readall_records():
+        for record in batch:
+            if record.type == "expense":
+                total += record.amount
+    return total
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as folder:
+        repository = repositories.TransactionRepository()
+        repository.file_path = os.path.join(folder, "transactions.csv")
+        write_ledger(repository.file_path, rows)
+        service = services.TransactionService(repository)
+
+        results = []
+        for name, scan in [("DictReader", dict_reader), ("records", record_reader)]:
+            start = time.perf_counter()
+            results.append(scan(service))
+            seconds = time.perf_counter() - start
+            print(f"{name:<12} {seconds:8.3f}s  {rows / seconds:12,.0f} rows/s")
+
+        assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Startup time of the CLI: wall clock from launching main.py to exiting at the prompt (and
+with a first command, which loads the user's totals), then the modules that take the
+longest to import (python -X importtime). Runs on the database in database/, use a copy
+with a large ledger to check the ledger is not loaded at startup
+
+Usage: python benchmarks/bench_startup.py [<runs>]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(commands, arguments=("main.py",)):
+    """
+    Return (seconds, stderr) of one run of python <arguments> (main.py by default)
+    reading commands at the prompt
+    """
+
+    # Let the interpreter cache the compiled modules, as an installed program would
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *arguments],
+        cwd=ROOT,
+        input=commands.encode(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        check=True,
+    )
+    return time.perf_counter() - start, result.stderr.decode()
+
+
+def import_times(stderr):
+    """
+    Return [(cumulative microseconds, module), ...] from the -X importtime output
+    """
+
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        times.append((int(cumulative), module.rstrip()))
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    # Warm up (compiled modules, file system cache)
+    run("exit\n")
+
+    for name, commands in [("startup", "exit\n"), ("+ balance", "bal\nexit\n")]:
+        seconds = [run(commands)[0] for _ in range(runs)]
+        print(
+            f"{name:<10} min {min(seconds) * 1000:7.1f} ms  "
+            f"median {statistics.median(seconds) * 1000:7.1f} ms"
+        )
+
+    baseline = [run("", ["-c", "pass"])[0] for _ in range(runs)]
+    print(f"{'python':<10} min {min(baseline) * 1000:7.1f} ms  (empty interpreter)")
+
+    _, stderr = run("exit\n", ["-X", "importtime", "main.py"])
+    print("\nSlowest imports (cumulative, ms):")
+    for cumulative, module in sorted(import_times(stderr), reverse=True)[:15]:
+        print(f"{cumulative / 1000:8.1f}  {module}")
+
+
+if __name__ == "__main__":
+    main()
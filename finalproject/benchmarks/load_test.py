@@ -0,0 +1,128 @@
+"""
+Load test of the HTTP/JSON API (python main.py serve): concurrent keep-alive clients
+send a mix of reads and writes, then requests/s and latency percentiles are reported
+per endpoint. Writes go to the served database, run the server on a copy of it
+
+Usage: python benchmarks/load_test.py [--port <port>] [--clients <n>]
+       [--requests <n>] [--write-ratio <0..1>]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+CATEGORIES = ["food", "transportation", "clothes", "medical", "education"]
+
+
+def percentile(latencies, fraction):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def next_request(write_ratio):
+    """
+    Return (name, method, target, body) of a random request
+    """
+
+    if random.random() < write_ratio:
+        transaction = {
+            "type": random.choice(["income", "expense"]),
+            "amount": random.randint(1, 100000),
+            "date_time": f"2026-{random.randint(1, 12):02d}-"
+            f"{random.randint(1, 28):02d} 12:00:00",
+            "category": random.choice(CATEGORIES),
+            "note": "",
+        }
+        return "save", "POST", "/transactions", json.dumps(transaction).encode()
+
+    match random.choice(["balance", "filter", "stats"]):
+        case "balance":
+            return "balance", "GET", "/balance", b""
+        case "filter":
+            category = random.choice(CATEGORIES)
+            target = f"/transactions?field=category&args={category}&limit=50"
+            return "filter", "GET", target, b""
+        case "stats":
+            return "stats", "GET", "/stats/expense-by-category", b""
+
+
+async def client(host, port, count, write_ratio, latencies, failures):
+    reader, writer = await asyncio.open_connection(host, port)
+    for _ in range(count):
+        name, method, target, body = next_request(write_ratio)
+        request = (
+            f"{method} {target} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        ).encode() + body
+
+        start = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        await reader.readexactly(length)
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+        if not head.split(b" ", 2)[1].startswith(b"2"):
+            failures[name] = failures.get(name, 0) + 1
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    latencies = {}
+    failures = {}
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client(
+                args.host,
+                args.port,
+                args.requests // args.clients,
+                args.write_ratio,
+                latencies,
+                failures,
+            )
+            for _ in range(args.clients)
+        )
+    )
+    seconds = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} requests, {args.clients} clients: {total / seconds:,.0f} req/s")
+    print(f"{'endpoint':<10} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for name, values in sorted(latencies.items()):
+        print(
+            f"{name:<10} {len(values):>9} {percentile(values, 0.5) * 1000:>8.2f} "
+            f"{percentile(values, 0.99) * 1000:>8.2f} {failures.get(name, 0):>7}"
+        )
+    every = [value for values in latencies.values() for value in values]
+    print(
+        f"{'all':<10} {total:>9} {percentile(every, 0.5) * 1000:>8.2f} "
+        f"{percentile(every, 0.99) * 1000:>8.2f} {sum(failures.values()):>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    random.seed(0)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,11 @@
+import array
+import bisect
+import collections
+import datetime
+import math
+import sys
+
+
 class Transaction:
     """
     Contains the attributes of a transaction. Can only be changed via the service module
@@ -8,6 +16,9 @@ class Transaction:
         - type and category are in lowercase
     """
 
+    # No per-instance dict
+    __slots__ = ("_id", "_type", "_amount", "_date_time", "_category", "_note")
+
     def __init__(self, id, type, amount, date_time, category, note):
         self._id = id
         self._type = type
@@ -55,6 +66,483 @@ class Transaction:
     def _set_note(self, value):
         self._note = value
 
+    def to_dict(self):
+        """
+        Return a dict(id, type, amount, date_time, category, note) for the repositories
+        """
+
+        return {
+            "id": self.id,
+            "type": self.type,
+            "amount": self.amount,
+            "date_time": self.date_time,
+            "category": self.category,
+            "note": self.note,
+        }
+
+
+# Read-only transaction for fast scans: amount is an int and date_time a datetime (the
+# stored string if it is not a valid date_time). A tuple needs no per-instance dict
+TransactionRecord = collections.namedtuple(
+    "TransactionRecord", ["id", "type", "amount", "date_time", "category", "note"]
+)
+
+
+def to_record(transaction):
+    """
+    Convert a transaction dict (as read from the repositories) to a TransactionRecord
+    """
+
+    date_time = to_date_time(transaction["date_time"])
+    return TransactionRecord(
+        transaction["id"],
+        transaction["type"],
+        int(transaction["amount"]),
+        date_time if date_time is not None else transaction["date_time"],
+        transaction["category"],
+        transaction["note"],
+    )
+
+
+def to_date_time(value):
+    """
+    Return the datetime of a date_time string, None if it is invalid
+    """
+
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class Ledger:
+    """
+    In-memory ledger stored as columns (struct of arrays) instead of one object per
+    transaction, about 28 bytes per transaction (about 40 with the secondary indexes):
+        - ids, amounts and epoch seconds of date_time: array("q")
+        - type and category: codes into the interned names, array("B") / array("H")
+        - alive: 1 byte per transaction, 0 once deleted
+        - notes, ids that are not zero-padded numbers and date_times that are not
+          valid (kept as stored): dicts, only for those rows
+    Transactions are kept in insertion order, a position is the index in the columns
+
+    Secondary indexes (see build_indexes) are kept up to date by append, update and
+    delete once built:
+        - category code: sorted array of positions (4 bytes per transaction)
+        - type code: bitmap of positions (1 bit per transaction)
+        - amount and date_time: positions sorted by the value (4 bytes per transaction
+          each), range queries bisect them on the column values
+    """
+
+    EPOCH = datetime.datetime(1970, 1, 1)
+    INVALID_DATE = -(2**63)
+
+    def __init__(self, records=(), id_digit_amount=9):
+        self.id_digit_amount = id_digit_amount
+
+        # Columns
+        self.ids = array.array("q")
+        self.types = array.array("B")
+        self.amounts = array.array("q")
+        self.epochs = array.array("q")
+        self.categories = array.array("H")
+        self.alive = bytearray()
+
+        # Interned names
+        self.type_names = []
+        self.type_codes = {}
+        self.category_names = []
+        self.category_codes = {}
+
+        # Sparse columns
+        self.notes = {}
+        self.odd_ids = {}
+        self.odd_dates = {}
+
+        # Ids are increasing unless an odd id was appended out of order
+        self.is_sorted = True
+        self.live_count = 0
+
+        # Secondary indexes, None until built
+        self.category_index = None
+        self.type_bitmaps = None
+        self.amount_positions = None
+        self.epoch_positions = None
+
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return self.live_count
+
+    def intern(self, names, codes, name):
+        if name not in codes:
+            codes[name] = len(names)
+            names.append(name)
+        return codes[name]
+
+    def to_epoch(self, date_time):
+        if date_time is None or isinstance(date_time, str):
+            return self.INVALID_DATE
+        return (date_time - self.EPOCH) // datetime.timedelta(seconds=1)
+
+    def to_date_time(self, epoch):
+        if epoch == self.INVALID_DATE:
+            return None
+        return self.EPOCH + datetime.timedelta(seconds=epoch)
+
+    def to_id(self, id):
+        """
+        Return the int stored for an id, None if it is not a number
+        """
+
+        return int(id) if id.isdigit() else None
+
+    def append(self, record):
+        """
+        Add a TransactionRecord, return its position
+        """
+
+        position = len(self.ids)
+
+        number = self.to_id(record.id)
+        if number is None or record.id != f"{number:0{self.id_digit_amount}d}":
+            self.odd_ids[position] = record.id
+        number = number if number is not None else -1
+        if self.ids and number <= self.ids[-1]:
+            self.is_sorted = False
+
+        self.ids.append(number)
+        self.types.append(self.intern(self.type_names, self.type_codes, record.type))
+        self.amounts.append(record.amount)
+        self.epochs.append(self.to_epoch(record.date_time))
+        self.categories.append(
+            self.intern(self.category_names, self.category_codes, record.category)
+        )
+        self.alive.append(1)
+        if record.note:
+            self.notes[position] = record.note
+        if isinstance(record.date_time, str) and record.date_time:
+            self.odd_dates[position] = record.date_time
+
+        self.live_count += 1
+        if self.category_index is not None:
+            self.index_add(position)
+        return position
+
+    def find(self, id):
+        """
+        Return the position of a live transaction, None if it does not exist
+        """
+
+        if self.is_sorted and (number := self.to_id(id)) is not None:
+            position = bisect.bisect_left(self.ids, number)
+            candidates = [position] if position < len(self.ids) else []
+        else:
+            candidates = range(len(self.ids))
+
+        for position in candidates:
+            if self.alive[position] and self.id(position) == id:
+                return position
+        return None
+
+    def id(self, position):
+        if position in self.odd_ids:
+            return self.odd_ids[position]
+        return f"{self.ids[position]:0{self.id_digit_amount}d}"
+
+    def date_time(self, position):
+        """
+        Return the datetime of a transaction, the stored string if it is not valid
+        """
+
+        if (date_time := self.to_date_time(self.epochs[position])) is not None:
+            return date_time
+        return self.odd_dates.get(position, "")
+
+    def record(self, position):
+        return TransactionRecord(
+            self.id(position),
+            self.type_names[self.types[position]],
+            self.amounts[position],
+            self.date_time(position),
+            self.category_names[self.categories[position]],
+            self.notes.get(position, ""),
+        )
+
+    def row(self, position):
+        """
+        Return a transaction dict in the repositories' format (all values are str)
+        """
+
+        date_time = self.date_time(position)
+        if not isinstance(date_time, str):
+            date_time = date_time.isoformat(sep=" ")
+        return {
+            "id": self.id(position),
+            "type": self.type_names[self.types[position]],
+            "amount": str(self.amounts[position]),
+            "date_time": date_time,
+            "category": self.category_names[self.categories[position]],
+            "note": self.notes.get(position, ""),
+        }
+
+    def positions(self):
+        """
+        Yield the positions of the live transactions in insertion order
+        """
+
+        alive = self.alive
+        for position in range(len(alive)):
+            if alive[position]:
+                yield position
+
+    def build_indexes(self):
+        """
+        Build the secondary indexes from the columns (one sort per sorted index)
+        """
+
+        positions = list(self.positions())
+
+        self.category_index = {}
+        for position in positions:
+            self.category_index.setdefault(
+                self.categories[position], array.array("I")
+            ).append(position)
+
+        self.type_bitmaps = {}
+        for position in positions:
+            bitmap = self.type_bitmap(self.types[position])
+            bitmap[position >> 3] |= 1 << (position & 7)
+
+        positions.sort(key=self.amounts.__getitem__)
+        self.amount_positions = array.array("I", positions)
+
+        positions.sort(key=self.epochs.__getitem__)
+        self.epoch_positions = array.array("I", positions)
+
+    def type_bitmap(self, code):
+        """
+        Return the bitmap of a type code, grown to cover every position
+        """
+
+        bitmap = self.type_bitmaps.setdefault(code, bytearray())
+        if len(bitmap) < (len(self.ids) + 7) >> 3:
+            bitmap.extend(bytes((len(self.ids) + 7 >> 3) - len(bitmap)))
+        return bitmap
+
+    def index_add(self, position):
+        positions = self.category_index.setdefault(
+            self.categories[position], array.array("I")
+        )
+        positions.insert(bisect.bisect_left(positions, position), position)
+
+        bitmap = self.type_bitmap(self.types[position])
+        bitmap[position >> 3] |= 1 << (position & 7)
+
+        for column, positions in [
+            (self.amounts, self.amount_positions),
+            (self.epochs, self.epoch_positions),
+        ]:
+            # Same values are kept in insertion order
+            index = bisect.bisect_right(
+                positions, column[position], key=column.__getitem__
+            )
+            positions.insert(index, position)
+
+    def index_remove(self, position):
+        positions = self.category_index[self.categories[position]]
+        del positions[bisect.bisect_left(positions, position)]
+
+        bitmap = self.type_bitmaps[self.types[position]]
+        bitmap[position >> 3] &= ~(1 << (position & 7))
+
+        for column, positions in [
+            (self.amounts, self.amount_positions),
+            (self.epochs, self.epoch_positions),
+        ]:
+            index = bisect.bisect_left(
+                positions, column[position], key=column.__getitem__
+            )
+            while positions[index] != position:
+                index += 1
+            del positions[index]
+
+    # Positions of the live transactions matching a filter. Without indexes the
+    # columns are scanned in insertion order, with them a filter costs O(log N + k):
+    # category and type in insertion order, amount and date_time ranges in value order
+
+    def select_category(self, category):
+        if (code := self.category_codes.get(category)) is None:
+            return
+
+        if self.category_index is not None:
+            yield from self.category_index.get(code, ())
+            return
+
+        categories = self.categories
+        for position in self.positions():
+            if categories[position] == code:
+                yield position
+
+    def select_type(self, type):
+        if (code := self.type_codes.get(type)) is None:
+            return
+
+        if self.type_bitmaps is not None:
+            for index, byte in enumerate(self.type_bitmaps.get(code, b"")):
+                if byte:
+                    for bit in range(8):
+                        if byte >> bit & 1:
+                            yield index << 3 | bit
+            return
+
+        types = self.types
+        for position in self.positions():
+            if types[position] == code:
+                yield position
+
+    def select_range(self, column, positions, start, end):
+        """
+        column: the amounts or epochs, positions: their sorted index
+        """
+
+        first, last = self.range_bounds(column, positions, start, end)
+        yield from positions[first:last]
+
+    def range_bounds(self, column, positions, start, end):
+        """
+        Return (first, last + 1) indexes in positions of the values in [start, end]
+        """
+
+        return (
+            bisect.bisect_left(positions, start, key=column.__getitem__),
+            bisect.bisect_right(positions, end, key=column.__getitem__),
+        )
+
+    # Number of live transactions an index returns (indexes must be built)
+
+    def count_category(self, code):
+        return len(self.category_index.get(code, ()))
+
+    def count_type(self, code):
+        return int.from_bytes(self.type_bitmaps.get(code, b""), "little").bit_count()
+
+    def count_range(self, column, positions, start, end):
+        first, last = self.range_bounds(column, positions, start, end)
+        return last - first
+
+    def select_date_range(self, start_date, end_date):
+        """
+        start_date and end_date are datetimes
+        """
+
+        start, end = self.to_epoch(start_date), self.to_epoch(end_date)
+        if self.epoch_positions is not None:
+            yield from self.select_range(
+                self.epochs, self.epoch_positions, start, end
+            )
+            return
+
+        epochs = self.epochs
+        for position in self.positions():
+            if start <= epochs[position] <= end:
+                yield position
+
+    def select_amount_range(self, min_amount, max_amount):
+        if self.amount_positions is not None:
+            yield from self.select_range(
+                self.amounts, self.amount_positions, min_amount, max_amount
+            )
+            return
+
+        amounts = self.amounts
+        for position in self.positions():
+            if min_amount <= amounts[position] <= max_amount:
+                yield position
+
+    def update(self, position, fields):
+        """
+        Change fields (dict of str values, as received by the repositories)
+        """
+
+        indexed = self.category_index is not None and self.alive[position]
+        if indexed:
+            self.index_remove(position)
+
+        for field, value in fields.items():
+            match field:
+                case "type":
+                    self.types[position] = self.intern(
+                        self.type_names, self.type_codes, value
+                    )
+                case "amount":
+                    self.amounts[position] = int(value)
+                case "date_time":
+                    self.epochs[position] = self.to_epoch(to_date_time(value))
+                    if self.epochs[position] == self.INVALID_DATE and value:
+                        self.odd_dates[position] = value
+                    else:
+                        self.odd_dates.pop(position, None)
+                case "category":
+                    self.categories[position] = self.intern(
+                        self.category_names, self.category_codes, value
+                    )
+                case "note":
+                    if value:
+                        self.notes[position] = value
+                    else:
+                        self.notes.pop(position, None)
+
+        if indexed:
+            self.index_add(position)
+
+    def delete(self, position):
+        if self.alive[position]:
+            if self.category_index is not None:
+                self.index_remove(position)
+            self.alive[position] = 0
+            self.live_count -= 1
+            self.notes.pop(position, None)
+            self.odd_dates.pop(position, None)
+
+    def memory_usage(self):
+        """
+        Return the bytes used by the columns, indexes and sparse dicts (names not
+        included)
+        """
+
+        columns = [self.ids, self.types, self.amounts, self.epochs, self.categories]
+        usage = self.index_usage()
+        usage += sum(column.itemsize * len(column) for column in columns)
+        usage += len(self.alive)
+        usage += sys.getsizeof(self.notes) + sum(
+            sys.getsizeof(note) for note in self.notes.values()
+        )
+        usage += sys.getsizeof(self.odd_ids) + sum(
+            sys.getsizeof(id) for id in self.odd_ids.values()
+        )
+        usage += sys.getsizeof(self.odd_dates) + sum(
+            sys.getsizeof(date_time) for date_time in self.odd_dates.values()
+        )
+        return usage
+
+    def index_usage(self):
+        """
+        Return the bytes used by the secondary indexes (0 if they are not built)
+        """
+
+        if self.category_index is None:
+            return 0
+
+        indexes = [*self.category_index.values(), self.amount_positions]
+        indexes.append(self.epoch_positions)
+        usage = sum(len(bitmap) for bitmap in self.type_bitmaps.values())
+        return usage + sum(index.itemsize * len(index) for index in indexes)
+
+    def bytes_per_transaction(self):
+        return self.memory_usage() / len(self.ids) if self.ids else 0
+
 
 class Categories:
     """
@@ -79,15 +567,173 @@ class Categories:
         self._categories.discard(category)
 
 
+class AmountSketch:
+    """
+    Distribution of amounts in logarithmic buckets (DDSketch): an amount x > 0 is counted
+    in bucket ceil(log(x) / log(gamma)), so any quantile is returned with a relative
+    error of at most RELATIVE_ACCURACY whatever the number of amounts. Amounts can also
+    be removed, and two sketches merge by adding their bucket counts
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, buckets=None, zero_count=0):
+        # Bucket keys are str when read from JSON
+        self.buckets = {int(key): count for key, count in (buckets or {}).items()}
+        self.zero_count = zero_count
+        self.count = zero_count + sum(self.buckets.values())
+
+    def add(self, amount, count=1):
+        """
+        Count an amount (count=-1 removes it)
+        """
+
+        if amount <= 0:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(amount) / self.LOG_GAMMA)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+            if self.buckets[key] == 0:
+                del self.buckets[key]
+        self.count += count
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def value(self, key):
+        # Middle of the bucket, at most RELATIVE_ACCURACY away from any amount in it
+        return 2 * self.GAMMA**key / (self.GAMMA + 1)
+
+    def quantile(self, q):
+        """
+        Return the amount at quantile q (0 <= q <= 1), None if the sketch is empty
+        """
+
+        if self.count <= 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.buckets))
+
+    def histogram(self, bins=10):
+        """
+        Return [(low, high, count)] of bins of the same width on a log scale between the
+        smallest and the largest amount, at most one bin per bucket
+        """
+
+        if not self.buckets:
+            return [(0, 0, self.zero_count)] if self.zero_count else []
+
+        low_key, high_key = min(self.buckets), max(self.buckets)
+        bins = min(bins, high_key - low_key + 1)
+        width = (high_key - low_key + 1) / bins
+        counts = [0] * bins
+        for key, count in self.buckets.items():
+            counts[min(int((key - low_key) / width), bins - 1)] += count
+        counts[0] += self.zero_count
+
+        histogram = []
+        for index, count in enumerate(counts):
+            low = self.GAMMA ** (low_key - 1 + index * width)
+            high = self.GAMMA ** (low_key - 1 + (index + 1) * width)
+            histogram.append((low, high, count))
+        return histogram
+
+    def to_dict(self):
+        return {"buckets": self.buckets, "zero_count": self.zero_count}
+
+
+class Rollups:
+    """
+    Totals of the transactions per period, and the distribution of their amounts. Can
+    only be changed via the service module
+
+        daily[<YYYY-MM-DD>][<type>][<category>] = [<sum of amounts>, <count>]
+        monthly[<YYYY-MM>][<type>][<category>] = [<sum of amounts>, <count>]
+        sketches[<type>][<category>] = AmountSketch
+
+    The period of a transaction is the start of its date_time string
+    """
+
+    def __init__(self, transaction_history=(), daily=None, monthly=None, sketches=None):
+        self._daily = daily if daily is not None else {}
+        self._monthly = monthly if monthly is not None else {}
+
+        # Sketches are dicts (AmountSketch.to_dict) when read from JSON
+        self._sketches = {}
+        for type, by_category in (sketches or {}).items():
+            for category, sketch in by_category.items():
+                self._sketches.setdefault(type, {})[category] = AmountSketch(**sketch)
+
+        for transaction in transaction_history:
+            self._add(
+                transaction["type"],
+                int(transaction["amount"]),
+                transaction["date_time"],
+                transaction["category"],
+            )
+
+    @property
+    def daily(self):
+        return self._daily
+
+    @property
+    def monthly(self):
+        return self._monthly
+
+    @property
+    def sketches(self):
+        return self._sketches
+
+    def _add(self, type, amount, date_time, category, sign=1):
+        by_category = self._sketches.setdefault(type, {})
+        sketch = by_category.setdefault(category, AmountSketch())
+        sketch.add(amount, sign)
+        if sketch.count == 0:
+            del by_category[category]
+
+        for periods, period in [
+            (self._daily, date_time[:10]),
+            (self._monthly, date_time[:7]),
+        ]:
+            by_category = periods.setdefault(period, {}).setdefault(type, {})
+            total = by_category.setdefault(category, [0, 0])
+            total[0] += sign * amount
+            total[1] += sign
+
+            # Drop empty totals so the rollups only hold periods with transactions
+            if total[1] == 0:
+                del by_category[category]
+                if not by_category:
+                    del periods[period][type]
+                    if not periods[period]:
+                        del periods[period]
+
+
 class User:
     """
     Contains the user's income and expense. Can only be changed via the service module
+
+    The totals start from the given values (e.g. a checkpoint), then the transaction
+    history is replayed on top of them
     """
 
-    def __init__(self, transaction_history):
-        self._transaction_count = 0
-        self._income = 0
-        self._expense = 0
+    def __init__(self, transaction_history, transaction_count=0, income=0, expense=0):
+        self._transaction_count = transaction_count
+        self._income = income
+        self._expense = expense
 
         for transaction in transaction_history:
             self._transaction_count += 1
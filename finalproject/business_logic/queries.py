@@ -0,0 +1,197 @@
+from business_logic import entities
+
+# Open ends of the ranges on the resident ledger
+SMALLEST = -(2**63) + 1
+LARGEST = 2**63 - 1
+
+
+class Query:
+    """
+    Filter on transaction fields, a transaction matches if all the given predicates
+    match (None: any value)
+        - category, type
+        - start_date, end_date: date_time strings (YYYY-MM-DD HH:MM:SS)
+        - min_amount, max_amount: ints
+    """
+
+    def __init__(
+        self,
+        category=None,
+        type=None,
+        start_date=None,
+        end_date=None,
+        min_amount=None,
+        max_amount=None,
+    ):
+        self.category = category
+        self.type = type
+        self.start_date = start_date
+        self.end_date = end_date
+        self.min_amount = int(min_amount) if min_amount is not None else None
+        self.max_amount = int(max_amount) if max_amount is not None else None
+
+    def predicates(self):
+        """
+        Return dict(field: value) of the given predicates, for repositories that filter
+        by themselves
+        """
+
+        return {name: value for name, value in vars(self).items() if value is not None}
+
+    def matches(self, transaction):
+        """
+        Check a transaction dict (as read from the repositories)
+        """
+
+        if self.category is not None and transaction["category"] != self.category:
+            return False
+        if self.type is not None and transaction["type"] != self.type:
+            return False
+        if self.start_date is not None and transaction["date_time"] < self.start_date:
+            return False
+        if self.end_date is not None and transaction["date_time"] > self.end_date:
+            return False
+        if self.min_amount is not None or self.max_amount is not None:
+            amount = int(transaction["amount"])
+            if self.min_amount is not None and amount < self.min_amount:
+                return False
+            if self.max_amount is not None and amount > self.max_amount:
+                return False
+        return True
+
+
+class Plan:
+    """
+    How a query is run: a description (e.g. for the table caption) and the stream of
+    matching transactions
+    """
+
+    def __init__(self, description, transactions):
+        self.description = description
+        self.transactions = transactions
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+
+def plan(query, ledger=None, repository=None):
+    """
+    Return the Plan of a query, from the cheapest source:
+        - the resident ledger: the most selective index gives the candidates, the
+          other predicates are checked on the columns
+        - the repository's own query (e.g. SQLite WHERE, partitions of the date range)
+        - a scan of the repository
+    """
+
+    if ledger is not None:
+        return plan_ledger(query, ledger)
+
+    if hasattr(repository, "query"):
+        fields = ", ".join(query.predicates()) or "none"
+        return Plan(
+            f"storage query ({fields})",
+            repository.query(query.predicates(), query.matches),
+        )
+
+    return Plan("full scan", filter(query.matches, repository.readall()))
+
+
+def plan_ledger(query, ledger):
+    # Predicates on the columns
+    category = type = None
+    if query.category is not None:
+        if (category := ledger.category_codes.get(query.category)) is None:
+            return Plan("ledger (unknown category)", iter(()))
+    if query.type is not None:
+        if (type := ledger.type_codes.get(query.type)) is None:
+            return Plan("ledger (unknown type)", iter(()))
+
+    start = end = None
+    if query.start_date is not None or query.end_date is not None:
+        start = SMALLEST
+        end = LARGEST
+        if query.start_date is not None:
+            start = ledger.to_epoch(to_date_time(query.start_date))
+        if query.end_date is not None:
+            end = ledger.to_epoch(to_date_time(query.end_date))
+
+    min_amount = query.min_amount if query.min_amount is not None else SMALLEST
+    max_amount = query.max_amount if query.max_amount is not None else LARGEST
+    has_amount = query.min_amount is not None or query.max_amount is not None
+
+    # Candidates: (estimated rows, index name, positions)
+    candidates = []
+    if ledger.category_index is not None:
+        if category is not None:
+            candidates.append(
+                (
+                    ledger.count_category(category),
+                    "category",
+                    lambda: ledger.select_category(query.category),
+                )
+            )
+        if type is not None:
+            candidates.append(
+                (
+                    ledger.count_type(type),
+                    "type",
+                    lambda: ledger.select_type(query.type),
+                )
+            )
+        if start is not None:
+            candidates.append(
+                (
+                    ledger.count_range(
+                        ledger.epochs, ledger.epoch_positions, start, end
+                    ),
+                    "date_time",
+                    lambda: ledger.select_range(
+                        ledger.epochs, ledger.epoch_positions, start, end
+                    ),
+                )
+            )
+        if has_amount:
+            candidates.append(
+                (
+                    ledger.count_range(
+                        ledger.amounts, ledger.amount_positions, min_amount, max_amount
+                    ),
+                    "amount",
+                    lambda: ledger.select_range(
+                        ledger.amounts,
+                        ledger.amount_positions,
+                        min_amount,
+                        max_amount,
+                    ),
+                )
+            )
+
+    if candidates:
+        estimate, index, positions = min(candidates, key=lambda candidate: candidate[0])
+        description = f"ledger index on {index} ({estimate} candidates)"
+        positions = positions()
+    else:
+        description = f"ledger scan ({len(ledger)} rows)"
+        positions = ledger.positions()
+
+    def transactions():
+        categories, types = ledger.categories, ledger.types
+        epochs, amounts = ledger.epochs, ledger.amounts
+        for position in positions:
+            if category is not None and categories[position] != category:
+                continue
+            if type is not None and types[position] != type:
+                continue
+            if start is not None and not start <= epochs[position] <= end:
+                continue
+            if has_amount and not min_amount <= amounts[position] <= max_amount:
+                continue
+            yield ledger.row(position)
+
+    return Plan(description, transactions())
+
+
+def to_date_time(value):
+    if (date_time := entities.to_date_time(value)) is None:
+        raise ValueError(f"Invalid date: {value}")
+    return date_time
@@ -1,4 +1,10 @@
-from business_logic import entities
+import bisect
+import collections
+import datetime
+import heapq
+import itertools
+
+from business_logic import entities, queries
 
 
 class UserService:
@@ -7,8 +13,18 @@ class UserService:
     deleted by user
     """
 
-    def __init__(self, user):
+    def __init__(self, user, checkpoint_repository=None):
         self.user = user
+        self.checkpoint_repository = checkpoint_repository
+
+    def add_transaction(self, type, amount):
+        if type == "income":
+            self.user._income += amount
+        elif type == "expense":
+            self.user._expense += amount
+        else:
+            raise ValueError(f"Unknown transaction type: {type}")
+        self.user._transaction_count += 1
 
     def apply_transaction(self, type_old, amount_old, type_new, amount_new):
         if type_old == "income":
@@ -25,6 +41,15 @@ class UserService:
         else:
             raise ValueError(f"Unknown transaction type: {type_new}")
 
+    def add_totals(self, transaction_count, income, expense):
+        """
+        Add the totals of many new transactions at once (bulk import)
+        """
+
+        self.user._transaction_count += transaction_count
+        self.user._income += income
+        self.user._expense += expense
+
     def revert_transaction(self, type, amount):
         if type == "income":
             self.user._income -= amount
@@ -32,38 +57,559 @@ class UserService:
             self.user._expense -= amount
         else:
             raise ValueError(f"Unknown transaction type: {type}")
+        self.user._transaction_count -= 1
+
+    def save_checkpoint(self, transaction_repository):
+        """
+        Save the totals tagged with the ledger's fingerprint (and tail, for ledgers that
+        can replay appended rows)
+        """
+
+        # Totals not loaded yet (nothing changed)
+        if self.checkpoint_repository is None or self.user is None:
+            return
+
+        fingerprint = transaction_repository.fingerprint()
+        checkpoint = {
+            "transaction_count": self.user.transaction_count,
+            "income": self.user.income,
+            "expense": self.user.expense,
+            "fingerprint": fingerprint,
+        }
+        if hasattr(transaction_repository, "tail"):
+            checkpoint["tail"] = transaction_repository.tail(fingerprint[0])
+        self.checkpoint_repository.save(checkpoint)
+
+
+def load_user(transaction_repository, checkpoint_repository):
+    """
+    Return the User from the checkpoint when it matches the ledger, replaying only the
+    rows appended after it if possible. The ledger is fully replayed when the checkpoint
+    is missing, stale or corrupt, then a new checkpoint is saved
+    """
+
+    checkpoint = checkpoint_repository.read()
+    fingerprint = transaction_repository.fingerprint()
+
+    if checkpoint is not None:
+        totals = {
+            "transaction_count": checkpoint["transaction_count"],
+            "income": checkpoint["income"],
+            "expense": checkpoint["expense"],
+        }
+
+        # Ledger did not change
+        if checkpoint["fingerprint"] == fingerprint:
+            return entities.User([], **totals)
+
+        # Rows were only appended
+        if hasattr(transaction_repository, "readall_from") and "tail" in checkpoint:
+            appended = transaction_repository.readall_from(
+                checkpoint["fingerprint"][0], checkpoint["tail"]
+            )
+            if appended is not None:
+                user = entities.User(appended, **totals)
+                UserService(user, checkpoint_repository).save_checkpoint(
+                    transaction_repository
+                )
+                return user
+
+    # Full rebuild
+    user = entities.User(transaction_repository.readall())
+    UserService(user, checkpoint_repository).save_checkpoint(transaction_repository)
+    return user
+
+
+class RollupService:
+    """
+    Keep the rollups (totals per day and month) up to date with the transactions
+    created, updated or deleted by user, and answer totals over a date range from them
+    """
+
+    def __init__(self, rollups, rollup_repository=None):
+        self.rollups = rollups
+        self.rollup_repository = rollup_repository
+
+    def add_transaction(self, type, amount, date_time, category):
+        self.rollups._add(type, amount, date_time, category)
+
+    def revert_transaction(self, type, amount, date_time, category):
+        self.rollups._add(type, amount, date_time, category, sign=-1)
+
+    def save(self, transaction_repository):
+        """
+        Save the rollups tagged with the ledger's fingerprint (and tail, for ledgers that
+        can replay appended rows)
+        """
+
+        if self.rollup_repository is None or self.rollups is None:
+            return
+
+        fingerprint = transaction_repository.fingerprint()
+        data = {
+            "daily": self.rollups.daily,
+            "monthly": self.rollups.monthly,
+            "sketches": {
+                type: {
+                    category: sketch.to_dict() for category, sketch in by_category.items()
+                }
+                for type, by_category in self.rollups.sketches.items()
+            },
+            "fingerprint": fingerprint,
+        }
+        if hasattr(transaction_repository, "tail"):
+            data["tail"] = transaction_repository.tail(fingerprint[0])
+        self.rollup_repository.save(data)
+
+    def totals(self, type, start_date=None, end_date=None):
+        """
+        Return (dict(category: <sum>), raw_ranges) for a type, optionally in a date range.
+        Whole months and days come from the rollups, the rows in raw_ranges (list of
+        (start_date, end_date), the partial days at both ends of the range) must be read
+        from the ledger
+
+        Format of date_time: YYYY-MM-DD HH:MM:SS
+        """
+
+        totals = {}
+
+        def add(period):
+            for category, (amount, _) in period.get(type, {}).items():
+                totals[category] = totals.get(category, 0) + amount
+
+        if start_date is None:
+            for period in self.rollups.monthly.values():
+                add(period)
+            return totals, []
+
+        first_day, last_day, raw_ranges = self.split_range(start_date, end_date)
+        if first_day is None:
+            return totals, raw_ranges
+
+        # calendar imports locale and re, it is only needed here
+        import calendar
+
+        months = set()
+        for month, period in self.rollups.monthly.items():
+            try:
+                year, number = map(int, month.split("-"))
+                days = calendar.monthrange(year, number)[1]
+            except ValueError:
+                continue
+            if first_day <= f"{month}-01" and f"{month}-{days:02d}" <= last_day:
+                add(period)
+                months.add(month)
+
+        for day, period in self.rollups.daily.items():
+            if first_day <= day <= last_day and day[:7] not in months:
+                add(period)
+
+        return totals, raw_ranges
+
+    def daily_totals(self, start_date=None, end_date=None):
+        """
+        Return (list of (day, type, category, <sum>, <count>), raw_ranges) of the days in
+        a date range (all days by default), raw_ranges as in totals()
+        """
+
+        raw_ranges = []
+        if start_date is not None:
+            first_day, last_day, raw_ranges = self.split_range(start_date, end_date)
+            if first_day is None:
+                return [], raw_ranges
+
+        entries = []
+        for day, period in self.rollups.daily.items():
+            if start_date is not None and not first_day <= day <= last_day:
+                continue
+            for type, by_category in period.items():
+                for category, (amount, count) in by_category.items():
+                    entries.append((day, type, category, amount, count))
+        return entries, raw_ranges
+
+    def split_range(self, start_date, end_date):
+        """
+        Return (first_day, last_day, raw_ranges): the days fully in a date range and the
+        partial days at both ends. first_day and last_day are None if no day is whole
+        """
+
+        start_day, end_day = start_date[:10], end_date[:10]
+        first_day = datetime.date.fromisoformat(start_day)
+        if start_date[11:] not in ["", "00:00:00"]:
+            first_day += datetime.timedelta(days=1)
+        last_day = datetime.date.fromisoformat(end_day)
+        if end_date[11:] != "23:59:59":
+            last_day -= datetime.timedelta(days=1)
+
+        if first_day > last_day:
+            return None, None, [(start_date, end_date)]
+
+        raw_ranges = []
+        if first_day.isoformat() != start_day:
+            raw_ranges.append((start_date, f"{start_day} 23:59:59"))
+        if last_day.isoformat() != end_day:
+            raw_ranges.append((end_day, end_date))
+
+        return first_day.isoformat(), last_day.isoformat(), raw_ranges
+
+    def sketch(self, type, category=None):
+        """
+        Return the AmountSketch of a type in a category, or of all categories merged
+        """
+
+        by_category = self.rollups.sketches.get(type, {})
+        if category is not None:
+            return by_category.get(category, entities.AmountSketch())
+
+        sketch = entities.AmountSketch()
+        for category_sketch in by_category.values():
+            sketch.merge(category_sketch)
+        return sketch
+
+
+class StatisticsAggregator:
+    """
+    Every breakdown of the statistics, computed in a single pass over the transactions
+    (or over the daily rollups, a day of totals is added like one transaction):
+        by_category[<type>][<category>] = <sum>
+        monthly[<YYYY-MM>][<type>] = <sum>
+        daily[<YYYY-MM-DD>][<type>] = <sum>
+        category_trend[<category>][<YYYY-MM>] = <sum of expenses>
+    """
+
+    def __init__(self):
+        self.by_category = {"income": {}, "expense": {}}
+        self.monthly = {}
+        self.daily = {}
+        self.category_trend = {}
+        self.transaction_count = 0
+
+    def add(self, type, amount, date_time, category, count=1):
+        by_category = self.by_category.setdefault(type, {})
+        by_category[category] = by_category.get(category, 0) + amount
+
+        for periods, period in [
+            (self.monthly, date_time[:7]),
+            (self.daily, date_time[:10]),
+        ]:
+            totals = periods.setdefault(period, {"income": 0, "expense": 0})
+            totals[type] = totals.get(type, 0) + amount
+
+        if type == "expense":
+            trend = self.category_trend.setdefault(category, {})
+            trend[date_time[:7]] = trend.get(date_time[:7], 0) + amount
+
+        self.transaction_count += count
+
+    def add_transactions(self, transactions):
+        for transaction in transactions:
+            self.add(
+                transaction["type"],
+                int(transaction["amount"]),
+                transaction["date_time"],
+                transaction["category"],
+            )
+
+
+def load_rollups(transaction_repository, rollup_repository):
+    """
+    Return the Rollups saved with the ledger when they match it, replaying only the rows
+    appended after them if possible. Otherwise they are rebuilt from the whole ledger,
+    then saved
+    """
+
+    data = rollup_repository.read()
+    fingerprint = transaction_repository.fingerprint()
+
+    if data is not None:
+        periods = {
+            "daily": data["daily"],
+            "monthly": data["monthly"],
+            "sketches": data["sketches"],
+        }
+
+        # Ledger did not change
+        if data["fingerprint"] == fingerprint:
+            return entities.Rollups([], **periods)
+
+        # Rows were only appended
+        if hasattr(transaction_repository, "readall_from") and "tail" in data:
+            appended = transaction_repository.readall_from(
+                data["fingerprint"][0], data["tail"]
+            )
+            if appended is not None:
+                rollups = entities.Rollups(appended, **periods)
+                RollupService(rollups, rollup_repository).save(transaction_repository)
+                return rollups
+
+    # Full rebuild
+    rollups = entities.Rollups(transaction_repository.readall())
+    RollupService(rollups, rollup_repository).save(transaction_repository)
+    return rollups
 
 
 class TransactionService:
-    def __init__(self, transaction_repository):
+    def __init__(
+        self, transaction_repository, fast_reader=False, cache=False, cache_max_rows=0
+    ):
         self.id_digit_amount = 9
         self.data_access = transaction_repository
 
+        # Scans that only aggregate read TransactionRecord batches instead of dicts
+        self.fast_reader = fast_reader
+
+        # Column-stored copy of the ledger, see load_ledger()
+        self.ledger = None
+
+        # Resident cache: reads are served from the ledger in memory while the
+        # repository's fingerprint is the one it was loaded (or last written) at. A
+        # ledger with more than cache_max_rows (0: no limit) is evicted and read from
+        # disk again
+        self.cache = cache
+        self.cache_max_rows = cache_max_rows
+        self.ledger_fingerprint = None
+
+        # Rows of an evicted ledger, counted by the writes of this service. Loading is
+        # not tried again while it stays over cache_max_rows
+        self.evicted_rows = None
+
     def create(self, user, **kwargs):
-        # Generate transaction id using auto-increment (transaction count)
+        # Generate transaction id using auto-increment (last id), ids are never reused
+        # even when transactions are deleted: last_id() is the greatest id ever created
+        last_id = self.data_access.last_id()
+        next_id = int(last_id) + 1 if last_id is not None else 1
         transaction = entities.Transaction(
-            f"{user.transaction_amount:0{self.id_digit_amount}d}", **kwargs
+            f"{next_id:0{self.id_digit_amount}d}", **kwargs
         )
 
-        self.data_access.create(transaction.__dict__)
+        self.data_access.create(transaction.to_dict())
+        self.count_evicted(1)
+        if self.ledger is not None:
+            self.ledger.append(entities.to_record(transaction.to_dict()))
+            self.sync_cache()
+
+    def create_many(self, transactions):
+        """
+        Create many transactions (dicts of transaction fields) with one write when the
+        repository supports it
+        """
+
+        last_id = self.data_access.last_id()
+        next_id = int(last_id) + 1 if last_id is not None else 1
+
+        rows = []
+        for transaction in transactions:
+            rows.append(
+                entities.Transaction(
+                    f"{next_id:0{self.id_digit_amount}d}", **transaction
+                ).to_dict()
+            )
+            next_id += 1
+
+        if hasattr(self.data_access, "import_transactions"):
+            self.data_access.import_transactions(rows)
+        else:
+            for row in rows:
+                self.data_access.create(row)
+
+        self.count_evicted(len(rows))
+        if self.ledger is not None:
+            for row in rows:
+                self.ledger.append(entities.to_record(row))
+            self.sync_cache()
 
     def readall(self):
+        if (ledger := self.resident()) is not None:
+            return (ledger.row(position) for position in ledger.positions())
         return self.data_access.readall()
 
+    def read(self, id):
+        if (ledger := self.resident()) is not None:
+            position = ledger.find(id)
+            return ledger.row(position) if position is not None else None
+        return self.data_access.read(id)
+
+    def readall_records(self, batch_size=4096):
+        """
+        Yield lists of TransactionRecord from the resident ledger, or read by the
+        repository's fast path if it has one (e.g. csv.reader instead of csv.DictReader)
+        """
+
+        if (ledger := self.resident()) is not None:
+            batch = []
+            for position in ledger.positions():
+                batch.append(ledger.record(position))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+
+        yield from self.repository_records(batch_size)
+
+    def repository_records(self, batch_size=4096):
+        if hasattr(self.data_access, "readall_records"):
+            yield from self.data_access.readall_records(
+                entities.TransactionRecord, batch_size
+            )
+            return
+
+        batch = []
+        for transaction in self.data_access.readall():
+            batch.append(entities.to_record(transaction))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def load_ledger(self, max_rows=0):
+        """
+        Load the whole ledger in memory as an entities.Ledger (columns instead of one
+        dict per transaction) with its secondary indexes. The service's own writes keep
+        it in sync
+
+        Return None (nothing loaded) if the ledger has more than max_rows (0: no limit)
+        """
+
+        self.ledger = None
+
+        # Apply pending write-ahead log writes first, they change the fingerprint
+        if hasattr(self.data_access, "checkpoint"):
+            self.data_access.checkpoint()
+        fingerprint = self.fingerprint()
+
+        ledger = entities.Ledger(id_digit_amount=self.id_digit_amount)
+        batches = self.repository_records()
+        for batch in batches:
+            for record in batch:
+                ledger.append(record)
+            if max_rows and len(ledger) > max_rows:
+                # Count the rest without keeping it, see resident()
+                self.evicted_rows = len(ledger) + sum(map(len, batches))
+                return None
+
+        ledger.build_indexes()
+        self.ledger = ledger
+        self.ledger_fingerprint = fingerprint
+        return ledger
+
+    def cached(self):
+        """
+        Return the cached ledger if it is loaded and up to date, without loading it
+        """
+
+        if self.ledger is not None and self.ledger_fingerprint == self.fingerprint():
+            return self.ledger
+        return None
+
+    def resident(self):
+        """
+        Return the cached ledger, (re)loaded if the repository changed since it was
+        loaded. None if the cache is disabled or the ledger is too large for it
+        """
+
+        if not self.cache:
+            return None
+
+        fingerprint = self.fingerprint()
+        if self.ledger is not None and self.ledger_fingerprint == fingerprint:
+            return self.ledger
+
+        # Do not retry loading a ledger that was too large while it stays too large
+        if self.evicted_rows is not None and self.evicted_rows > self.cache_max_rows:
+            return None
+
+        self.evicted_rows = None
+        return self.load_ledger(self.cache_max_rows)
+
+    def sync_cache(self):
+        """
+        Mark the cached ledger as up to date with the repository, after a change made
+        through this service (e.g. a write or a write-ahead log checkpoint)
+        """
+
+        if self.ledger is None:
+            return
+
+        if self.cache_max_rows and len(self.ledger) > self.cache_max_rows:
+            self.evicted_rows = len(self.ledger)
+            self.ledger = None
+            return
+
+        self.ledger_fingerprint = self.fingerprint()
+
+    def count_evicted(self, rows):
+        if self.evicted_rows is not None:
+            self.evicted_rows += rows
+
+    def expire_cache(self):
+        """
+        Drop the cached ledger if the repository changed since it was loaded (e.g. by
+        another process), so writes are not applied to a stale copy
+        """
+
+        if self.ledger is not None and self.ledger_fingerprint != self.fingerprint():
+            self.ledger = None
+
+    def fingerprint(self):
+        return self.data_access.fingerprint()
+
     def update(self, id, **kwargs):
         # Transaction id cannot be updated, only generated once when created
         if "id" in kwargs:
             raise ValueError("Transaction id cannot be updated")
 
-        return self.data_access.update(id, kwargs)
+        return_data = self.data_access.update(id, **kwargs)
+        if return_data is not None and self.ledger is not None:
+            if (position := self.ledger.find(id)) is not None:
+                self.ledger.update(
+                    position, {field: str(value) for field, value in kwargs.items()}
+                )
+            self.sync_cache()
+        return return_data
 
     def delete(self, id):
         """
         Delete a specified transaction and return a dict(type, amount) for UserService
         """
-        return self.data_access.delete(id)
+
+        return_data = self.data_access.delete(id)
+        if return_data is not None:
+            self.count_evicted(-1)
+        if return_data is not None and self.ledger is not None:
+            if (position := self.ledger.find(id)) is not None:
+                self.ledger.delete(position)
+            self.sync_cache()
+        return return_data
+
+    def query(self, query):
+        """
+        Return the queries.Plan of a queries.Query (filter on many fields)
+        """
+
+        return queries.plan(query, self.resident(), self.data_access)
+
+    # The resident ledger is filtered in memory, repositories with indexes (e.g. SQLite)
+    # filter by themselves, the others are scanned here
+
+    def rows(self, ledger, positions):
+        for position in positions:
+            yield ledger.row(position)
 
     def filter_by_category(self, category):
+        if (ledger := self.resident()) is not None:
+            yield from self.rows(ledger, ledger.select_category(category))
+            return
+
+        yield from self.repository_filter_by_category(category)
+
+    def repository_filter_by_category(self, category):
+        if hasattr(self.data_access, "filter_by_category"):
+            yield from self.data_access.filter_by_category(category)
+            return
+
         for transaction in self.data_access.readall():
             if transaction["category"] == category:
                 yield transaction
@@ -72,22 +618,176 @@ class TransactionService:
         """
         Format of date_time: YYYY-MM-DD HH:MM:SS
         """
+
+        ledger = self.resident()
+        start, end = entities.to_date_time(start_date), entities.to_date_time(end_date)
+        if ledger is not None and start is not None and end is not None:
+            yield from self.rows(ledger, ledger.select_date_range(start, end))
+            return
+
+        yield from self.repository_filter_by_date_range(start_date, end_date)
+
+    def repository_filter_by_date_range(self, start_date, end_date):
+        if hasattr(self.data_access, "filter_by_date_range"):
+            yield from self.data_access.filter_by_date_range(start_date, end_date)
+            return
+
         for transaction in self.data_access.readall():
             if start_date <= transaction["date_time"] <= end_date:
                 yield transaction
 
     def filter_by_type(self, type):
+        if (ledger := self.resident()) is not None:
+            yield from self.rows(ledger, ledger.select_type(type))
+            return
+
+        if hasattr(self.data_access, "filter_by_type"):
+            yield from self.data_access.filter_by_type(type)
+            return
+
         for transaction in self.data_access.readall():
             if transaction["type"] == type:
                 yield transaction
 
     def filter_by_amount_range(self, min_amount, max_amount):
+        if (ledger := self.resident()) is not None:
+            yield from self.rows(
+                ledger, ledger.select_amount_range(int(min_amount), int(max_amount))
+            )
+            return
+
+        if hasattr(self.data_access, "filter_by_amount_range"):
+            yield from self.data_access.filter_by_amount_range(min_amount, max_amount)
+            return
+
         for transaction in self.data_access.readall():
             if int(min_amount) <= int(transaction["amount"]) <= int(max_amount):
                 yield transaction
 
-    # Add sort by transaction fields
-    ...
+    def scan(self, start_date=None, end_date=None, category=None):
+        """
+        Yield the transactions (optionally in a date range and/or of a category) for a
+        single pass such as an export: from the resident ledger if it is loaded and up
+        to date, else streamed from the repository without loading the ledger
+        """
+
+        cached = self.cached() is not None
+        if start_date is not None or end_date is not None:
+            filter_by_date_range = (
+                self.filter_by_date_range
+                if cached
+                else self.repository_filter_by_date_range
+            )
+            transactions = filter_by_date_range(start_date or "", end_date or "9999")
+            if category is not None:
+                transactions = (t for t in transactions if t["category"] == category)
+        elif category is not None:
+            filter_by_category = (
+                self.filter_by_category
+                if cached
+                else self.repository_filter_by_category
+            )
+            transactions = filter_by_category(category)
+        else:
+            transactions = self.readall() if cached else self.data_access.readall()
+        yield from transactions
+
+    # Sorted queries only keep the rows they return in memory
+
+    # Key of the sortable fields for transaction dicts
+    SORT_KEYS = {
+        "amount": lambda transaction: int(transaction["amount"]),
+        "date_time": lambda transaction: transaction["date_time"],
+    }
+
+    def top(self, field, limit, descending=False):
+        """
+        Return the first limit transactions sorted by field (amount or date_time): read
+        from the ledger's sorted index when it is resident, else a heap of limit rows
+        over the stream
+        """
+
+        if field not in self.SORT_KEYS:
+            raise ValueError(f"Cannot sort by: {field}")
+
+        if (ledger := self.resident()) is not None:
+            if field == "amount":
+                positions = ledger.amount_positions
+            else:
+                positions = ledger.epoch_positions
+            if descending:
+                positions = positions[: -limit - 1 : -1]
+            else:
+                positions = positions[:limit]
+            return [ledger.row(position) for position in positions]
+
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return select(limit, self.readall(), key=self.SORT_KEYS[field])
+
+    def recent(self, limit):
+        """
+        Return the last limit transactions created, newest first: from the resident
+        ledger if it is up to date, else read backwards from the end of the repository
+        """
+
+        ledger = self.cached()
+        if ledger is None and hasattr(self.data_access, "readall_reverse"):
+            return list(itertools.islice(self.data_access.readall_reverse(), limit))
+        if ledger is None:
+            ledger = self.resident()
+
+        if ledger is not None:
+            transactions = []
+            for position in range(len(ledger.alive) - 1, -1, -1):
+                if len(transactions) == limit:
+                    break
+                if ledger.alive[position]:
+                    transactions.append(ledger.row(position))
+            return transactions
+
+        # Only the last limit rows are kept while reading
+        return list(reversed(collections.deque(self.readall(), maxlen=limit)))
+
+    def page(self, after=None, limit=50):
+        """
+        Return up to limit transactions following the one of id after (from the first
+        one if after is None), in the repository's order. The repository seeks to the
+        page if it can, the rows before it are not read
+        """
+
+        if self.ledger is not None and self.ledger_fingerprint == self.fingerprint():
+            ledger = self.ledger
+        elif hasattr(self.data_access, "read_page"):
+            return self.data_access.read_page(after, limit)
+        else:
+            ledger = self.resident()
+
+        if ledger is not None:
+            start = 0
+            if after is not None and ledger.is_sorted:
+                start = bisect.bisect_right(ledger.ids, int(after))
+            elif after is not None:
+                start = len(ledger.alive)
+                for position in range(len(ledger.alive)):
+                    if ledger.id(position) == after:
+                        start = position + 1
+                        break
+
+            transactions = []
+            for position in range(start, len(ledger.alive)):
+                if len(transactions) == limit:
+                    break
+                if ledger.alive[position]:
+                    transactions.append(ledger.row(position))
+            return transactions
+
+        # Skip the rows up to the one of id after
+        transactions = iter(self.readall())
+        if after is not None:
+            for transaction in transactions:
+                if transaction["id"] == after:
+                    break
+        return list(itertools.islice(transactions, limit))
 
 
 # class CategoryService: is in entities (Categories)
@@ -0,0 +1,15 @@
+from business_logic import entities
+
+
+def test_histogram_has_at_most_one_bin_per_bucket():
+    sketch = entities.AmountSketch()
+    sketch.add(100, count=3)
+
+    [(low, high, count)] = sketch.histogram()
+    assert low <= 100 <= high
+    assert count == 3
+
+    sketch.add(10**6)
+    histogram = sketch.histogram()
+    assert len(histogram) == 10
+    assert sum(count for _, _, count in histogram) == 4
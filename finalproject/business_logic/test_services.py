@@ -0,0 +1,84 @@
+import pytest
+
+from business_logic import services
+from data_access import repositories
+
+
+def test_ledger_over_the_cache_limit_is_not_reloaded(
+    database, make_transaction, monkeypatch
+):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 301)])
+    service = services.TransactionService(repository, cache=True, cache_max_rows=100)
+
+    loads = []
+    load_ledger = service.load_ledger
+    monkeypatch.setattr(
+        service, "load_ledger", lambda *args: loads.append(1) or load_ledger(*args)
+    )
+
+    assert service.resident() is None
+    assert service.evicted_rows == 300
+    fields = make_transaction(0)
+    del fields["id"]
+    for _ in range(5):
+        service.create(None, **fields)
+        assert service.resident() is None
+    assert len(loads) == 1
+
+    # Loaded again once it fits
+    for id in range(1, 206):
+        service.delete(f"{id:09d}")
+    assert service.resident() is not None
+    assert len(service.ledger) == 100
+    assert len(loads) == 2
+
+
+@pytest.mark.parametrize(
+    "repository_class",
+    [repositories.TransactionRepository, repositories.FixedWidthTransactionRepository],
+)
+def test_resident_ledger_keeps_invalid_dates(
+    database, make_transaction, repository_class
+):
+    repository = repository_class()
+    stored = [
+        make_transaction(1),
+        make_transaction(2, date_time="2026-1-5 1:2:3"),
+        make_transaction(3, date_time=""),
+    ]
+    repository.import_transactions(stored)
+    service = services.TransactionService(repository, cache=True)
+
+    assert list(service.readall()) == stored
+    assert service.resident() is not None
+    assert list(service.filter_by_category("food")) == stored
+
+    service.update(f"{1:09d}", date_time="not a date")
+    service.update(f"{2:09d}", date_time="2026-01-05 01:02:03")
+    assert [t["date_time"] for t in service.readall()] == [
+        "not a date",
+        "2026-01-05 01:02:03",
+        "",
+    ]
+    assert list(service.readall()) == list(repository.readall())
+
+
+@pytest.mark.parametrize("storage", ["csv", "fixed", "sqlite", "partitioned"])
+def test_ids_are_not_reused_after_delete(database, make_transaction, storage):
+    config = dict(repositories.DEFAULT_CONFIG, storage=storage)
+    repository = repositories.open_ledger(config)
+    repository.import_transactions([make_transaction(id) for id in range(1, 4)])
+    service = services.TransactionService(repository, cache=True)
+    assert service.resident() is not None
+
+    service.delete(f"{3:09d}")
+    if storage == "fixed":
+        repository.compact()
+    fields = make_transaction(0)
+    del fields["id"]
+    service.create(None, **fields)
+
+    assert [t["id"] for t in service.readall()] == [f"{id:09d}" for id in [1, 2, 4]]
+    assert service.ledger.is_sorted
+    assert int(repositories.open_ledger(config).last_id()) == 4
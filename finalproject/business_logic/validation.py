@@ -1,4 +1,13 @@
 import datetime
+import functools
+import re
+
+# date_time as it is written by the program: YYYY-MM-DD HH:MM:SS
+DATE_TIME = re.compile(
+    r"([0-9]{4})-([0-9]{2})-([0-9]{2}) ([0-9]{2}):([0-9]{2}):([0-9]{2})"
+)
+
+DAYS_IN_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
 
 
 class TransactionValidation:
@@ -7,7 +16,8 @@ class TransactionValidation:
     """
 
     def __init__(self, categories):
-        self.defined_categories = set(categories)  # Store state, so use class
+        # entities.Categories (not a copy), categories added later are valid
+        self.categories = categories
 
     def type_validate(self, value):
         return value in ["income", "expense"]
@@ -19,11 +29,86 @@ class TransactionValidation:
             return False
 
     def date_time_validate(self, value):
+        return is_date_time(value)
+
+    def date_time_canonical(self, value):
+        return canonical_date_time(value)
+
+    def category_validate(self, value):
+        return value in self.categories.categories
+
+    def note_validate(self, value):
+        # A stored row is one line of the ledger
+        return "\n" not in value and "\r" not in value
+
+    def validate_many(self, transactions):
+        """
+        Validate a batch of transactions column by column, each distinct value of a
+        column is validated once. Return dict(<index in batch>: [<error>, ...]) of the
+        invalid transactions, one error per missing or invalid field (note is optional)
+        """
+
+        validators = {
+            "type": self.type_validate,
+            "amount": self.amount_validate,
+            "date_time": self.date_time_validate,
+            "category": self.category_validate,
+            "note": self.note_validate,
+        }
+
+        errors = {}
+        for field, validate in validators.items():
+            results = {}
+            for index, transaction in enumerate(transactions):
+                value = transaction.get(field)
+                if value is None or value == "":
+                    if field != "note":
+                        errors.setdefault(index, []).append(f"Missing {field}")
+                    continue
+                if value not in results:
+                    results[value] = validate(value)
+                if not results[value]:
+                    errors.setdefault(index, []).append(f"Invalid {field}: {value}")
+        return errors
+
+
+@functools.lru_cache(maxsize=4096)
+def is_date_time(value):
+    """
+    Return True if value is a date_time (YYYY-MM-DD HH:MM:SS). Values in the exact
+    format are checked field by field, strptime is only called for the others (it also
+    accepts e.g. single digit months). Results are cached, bulk loads repeat timestamps
+    """
+
+    if (match := DATE_TIME.fullmatch(value)) is None:
         try:
             datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
             return True
         except ValueError:
             return False
 
-    def category_validate(self, value):
-        return value in self.defined_categories
+    year, month, day, hour, minute, second = map(int, match.groups())
+    if year < datetime.MINYEAR or not 1 <= month <= 12:
+        return False
+
+    days = DAYS_IN_MONTH[month - 1]
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        days = 29
+    return 1 <= day <= days and hour < 24 and minute < 60 and second < 60
+
+
+@functools.lru_cache(maxsize=4096)
+def canonical_date_time(value):
+    """
+    Return a valid date_time written as YYYY-MM-DD HH:MM:SS (e.g. 2026-1-5 1:2:3 as
+    2026-01-05 01:02:03), the only format the ledger and the date filters read
+    """
+
+    if DATE_TIME.fullmatch(value) is not None:
+        return value
+
+    d = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    return (
+        f"{d.year:04d}-{d.month:02d}-{d.day:02d} "
+        f"{d.hour:02d}:{d.minute:02d}:{d.second:02d}"
+    )
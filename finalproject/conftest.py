@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from data_access import locks, repositories, snapshot
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Point the repositories, the ledger lock and the snapshot to a new database folder in
+    tmp_path (they find it next to their module), return its path
+    """
+
+    package = tmp_path / "data_access"
+    package.mkdir()
+    for module in [repositories, locks, snapshot]:
+        monkeypatch.setattr(
+            module, "__file__", str(package / os.path.basename(module.__file__))
+        )
+
+    # Write-ahead logs are closed by the tests, not at exit
+    monkeypatch.setattr(repositories.atexit, "register", lambda function: None)
+
+    (tmp_path / "database").mkdir()
+    repositories.initialize_database()
+    return tmp_path / "database"
+
+
+@pytest.fixture
+def make_transaction():
+    def make(id, **fields):
+        return {
+            "id": f"{id:09d}",
+            "type": "expense",
+            "amount": "100",
+            "date_time": "2026-01-01 12:00:00",
+            "category": "food",
+            "note": "",
+            **fields,
+        }
+
+    return make
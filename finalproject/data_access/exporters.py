@@ -0,0 +1,87 @@
+import csv
+import json
+
+FIELDNAMES = ["id", "type", "amount", "date_time", "category", "note"]
+
+
+def export_csv(transactions, path):
+    """
+    Write a stream of transactions to a csv file, return the number of rows
+    """
+
+    count = 0
+    with open(path, "w", newline="") as file:
+        pen = csv.DictWriter(file, fieldnames=FIELDNAMES, extrasaction="ignore")
+        pen.writeheader()
+        for transaction in transactions:
+            pen.writerow(transaction)
+            count += 1
+    return count
+
+
+def export_jsonl(transactions, path):
+    """
+    Write a stream of transactions to a JSON Lines file (amount as a number), return the
+    number of rows
+    """
+
+    count = 0
+    with open(path, "w") as file:
+        for transaction in transactions:
+            row = {field: transaction[field] for field in FIELDNAMES}
+            row["amount"] = int(row["amount"])
+            file.write(json.dumps(row) + "\n")
+            count += 1
+    return count
+
+
+def export_parquet(transactions, path, batch_size=65536):
+    """
+    Write a stream of transactions to a Parquet file, one row group per batch so only a
+    batch is in memory. Requires pyarrow. Return the number of rows
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pyarrow.schema(
+        [
+            ("id", pyarrow.string()),
+            ("type", pyarrow.string()),
+            ("amount", pyarrow.int64()),
+            ("date_time", pyarrow.string()),
+            ("category", pyarrow.string()),
+            ("note", pyarrow.string()),
+        ]
+    )
+
+    def write_batch(writer, columns):
+        columns["amount"] = [int(amount) for amount in columns["amount"]]
+        writer.write_table(pyarrow.table(columns, schema=schema))
+
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        columns = {field: [] for field in FIELDNAMES}
+        for transaction in transactions:
+            for field in FIELDNAMES:
+                columns[field].append(transaction[field])
+            count += 1
+
+            if count % batch_size == 0:
+                write_batch(writer, columns)
+                columns = {field: [] for field in FIELDNAMES}
+
+        if columns["id"]:
+            write_batch(writer, columns)
+
+    return count
+
+
+EXPORTERS = {
+    "csv": export_csv,
+    "jsonl": export_jsonl,
+    "parquet": export_parquet,
+}
@@ -0,0 +1,108 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+SHARED = 1
+EXCLUSIVE = 2
+
+
+class LedgerLock:
+    """
+    Reader/writer lock shared by the processes using the same database folder, plus the
+    ledger version: a counter incremented by every write, so a process knows when its
+    totals are stale without reading the ledger
+
+    The lock is a lock file locked with fcntl.flock (msvcrt.locking on Windows, where
+    readers also lock exclusively). It is reentrant within a process: nested sections
+    only count depth, and an exclusive section inside a shared one upgrades the lock
+    until it ends
+    """
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        self.lock_path = os.path.join(database, "ledger.lock")
+        self.version_path = os.path.join(database, "ledger.version")
+
+        self.file = open(self.lock_path, "a+b")
+        self.mode = None
+        self.depth = 0
+
+    def acquire(self, mode):
+        if fcntl is not None:
+            fcntl.flock(
+                self.file.fileno(), fcntl.LOCK_SH if mode == SHARED else fcntl.LOCK_EX
+            )
+            return
+
+        # LK_LOCK gives up after 10 seconds
+        self.file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @contextlib.contextmanager
+    def hold(self, mode):
+        previous = self.mode
+        if previous is None or (mode == EXCLUSIVE and previous == SHARED):
+            if previous is not None and fcntl is None:
+                # msvcrt locks are already exclusive
+                mode = previous
+            else:
+                self.acquire(mode)
+            self.mode = mode
+        self.depth += 1
+
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.release()
+                self.mode = None
+            elif previous is not None and self.mode != previous:
+                # Back to shared after an upgrade
+                self.acquire(previous)
+                self.mode = previous
+
+    def shared(self):
+        return self.hold(SHARED)
+
+    def exclusive(self):
+        return self.hold(EXCLUSIVE)
+
+    def version(self):
+        try:
+            with open(self.version_path, "r") as file:
+                return int(file.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump(self):
+        """
+        Increment the ledger version, return it. The caller holds the exclusive lock
+        """
+
+        version = self.version() + 1
+        with open(self.version_path, "w") as file:
+            file.write(str(version))
+        return version
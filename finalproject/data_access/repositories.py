@@ -1,5 +1,178 @@
+import atexit
 import csv
+import datetime
+import io
+import json
 import os
+import threading
+import types
+
+from data_access import locks
+
+
+def open_temporary(template, mode="w", **kwargs):
+    """
+    Create a temporary file named after template (e.g. temporary_files/tmp.csv gives
+    temporary_files/tmp-<random>.csv) that no other writer uses, return (file, path).
+    The caller moves it onto the target with os.replace
+    """
+
+    import tempfile
+
+    folder, name = os.path.split(template)
+    stem, extension = os.path.splitext(name)
+    fd, path = tempfile.mkstemp(suffix=extension, prefix=stem + "-", dir=folder)
+    return os.fdopen(fd, mode, **kwargs), path
+
+
+class IdIndex:
+    """
+    Sidecar index of transactions.csv, maps each id to the byte offset of its row
+
+    File layout: a header entry holding the size of the csv file when the index was last
+    written, then one entry per row sorted by id. Every entry has the same size, so an id
+    is found by binary search on the file. The index is rebuilt when the csv size does
+    not match the header (e.g. the csv was edited by hand)
+    """
+
+    ID_WIDTH = 12
+    OFFSET_WIDTH = 15
+    ENTRY_SIZE = ID_WIDTH + OFFSET_WIDTH + 1
+
+    def __init__(self, file_path, csv_path):
+        self.file_path = file_path
+        self.csv_path = csv_path
+
+    def entry(self, id, offset):
+        return f"{id:0{self.ID_WIDTH}d}{offset:0{self.OFFSET_WIDTH}d}\n".encode()
+
+    def header(self, csv_size):
+        return f"{csv_size:0{self.ENTRY_SIZE - 1}d}\n".encode()
+
+    def is_fresh(self):
+        if not os.path.exists(self.file_path):
+            return False
+        with open(self.file_path, "rb") as file:
+            header = file.read(self.ENTRY_SIZE)
+        return header[:-1].isdigit() and int(header) == os.path.getsize(self.csv_path)
+
+    def rebuild(self):
+        entries = []
+        with open(self.csv_path, "rb") as file:
+            offset = len(file.readline())
+            for line in file:
+                id = line.split(b",", 1)[0]
+                if id.isdigit():
+                    entries.append((int(id), offset))
+                offset += len(line)
+
+        entries.sort()
+        # Readers may rebuild a stale index at the same time
+        file, tmp = open_temporary(self.file_path, "wb")
+        with file:
+            file.write(self.header(offset))
+            file.writelines(self.entry(id, offset) for id, offset in entries)
+        os.replace(tmp, self.file_path)
+
+    def lookup(self, id):
+        """
+        Return (position, offset) of an id, (None, None) if it is not in the index
+        """
+
+        try:
+            id = int(id)
+        except ValueError:
+            return None, None
+
+        position, entry = self.bisect(id)
+        if entry and int(entry[: self.ID_WIDTH]) == id:
+            return position, int(entry[self.ID_WIDTH : -1])
+        return None, None
+
+    def offset_after(self, id):
+        """
+        Return the offset of the first row whose id is greater than id, None if there is
+        no such row
+        """
+
+        _, entry = self.bisect(int(id) + 1)
+        return int(entry[self.ID_WIDTH : -1]) if entry else None
+
+    def bisect(self, id):
+        """
+        Return (position, entry) of the first entry whose id is not less than id (int),
+        entry is empty if there is none
+        """
+
+        if not self.is_fresh():
+            self.rebuild()
+
+        with open(self.file_path, "rb") as file:
+            low = 0
+            high = file.seek(0, os.SEEK_END) // self.ENTRY_SIZE - 1
+            while low < high:
+                middle = (low + high) // 2
+                file.seek((middle + 1) * self.ENTRY_SIZE)
+                if int(file.read(self.ID_WIDTH)) < id:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            file.seek((low + 1) * self.ENTRY_SIZE)
+            return low, file.read(self.ENTRY_SIZE)
+
+    def append(self, entries, csv_size):
+        """
+        Add the (id, offset) of rows just appended. The caller checks freshness before
+        writing
+        """
+
+        with open(self.file_path, "r+b") as file:
+            size = file.seek(0, os.SEEK_END)
+            last_id = -1
+            if size > self.ENTRY_SIZE:
+                file.seek(size - self.ENTRY_SIZE)
+                last_id = int(file.read(self.ID_WIDTH))
+
+            data = []
+            for id, offset in entries:
+                if not str(id).isdigit() or int(id) <= last_id:
+                    # Out of order, rebuild on the next lookup
+                    file.truncate(0)
+                    return
+                last_id = int(id)
+                data.append(self.entry(last_id, offset))
+
+            file.seek(0, os.SEEK_END)
+            file.writelines(data)
+            file.seek(0)
+            file.write(self.header(csv_size))
+
+    def shift(self, offset, delta, csv_size, remove=None):
+        """
+        Move the offsets of rows after offset by delta, remove the entry at position
+        remove (if given)
+        """
+
+        with open(self.file_path, "rb") as file:
+            file.seek(self.ENTRY_SIZE)
+            data = file.read()
+
+        entries = []
+        for position, start in enumerate(range(0, len(data), self.ENTRY_SIZE)):
+            if position == remove:
+                continue
+            id = int(data[start : start + self.ID_WIDTH])
+            entry_offset = int(
+                data[start + self.ID_WIDTH : start + self.ENTRY_SIZE - 1]
+            )
+            if entry_offset > offset:
+                entry_offset += delta
+            entries.append(self.entry(id, entry_offset))
+
+        with open(self.file_path, "wb") as file:
+            file.write(self.header(csv_size))
+            file.writelines(entries)
 
 
 class TransactionRepository:
@@ -14,88 +187,1320 @@ class TransactionRepository:
         # Transaction history
         self.file_path = os.path.join(database, "transactions.csv")
 
+        # Id index (rebuilt on demand)
+        self.index = IdIndex(os.path.join(database, "transactions.idx"), self.file_path)
+
+        # Id of the last transaction once it was deleted, see last_id()
+        self.last_id_path = os.path.join(database, "transactions.csv.last_id")
+
         # Temporary files
         self.tmp = os.path.join(database, "temporary_files", "tmp.csv")
 
+    def encode(self, transaction):
+        """
+        Return the csv row of a transaction. A row is always one line (the id index, the
+        pages and the reverse reader read lines), fields with a line break are rejected
+        """
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(
+            [transaction.get(field, "") for field in self.FIELDNAMES]
+        )
+        line = buffer.getvalue()
+        check_line(line)
+        return line.encode()
+
+    def to_transaction(self, line):
+        return dict(zip(self.FIELDNAMES, next(csv.reader([line.decode()]))))
+
     def create(self, transaction):
-        with open(self.file_path, "a", newline="") as file:
-            pen = csv.DictWriter(file, fieldnames=self.FIELDNAMES)
-            pen.writerow(transaction)
+        self.import_transactions([transaction])
+
+    def import_transactions(self, transactions):
+        """
+        Append many transactions with a single buffered write
+        """
+
+        # One csv writer for the batch, each row is taken out of the buffer to know its
+        # size in bytes. The whole batch is encoded (and checked) before writing
+        buffer = io.StringIO()
+        pen = csv.writer(buffer)
+        ids = []
+        lines = []
+        for transaction in transactions:
+            pen.writerow([transaction.get(field, "") for field in self.FIELDNAMES])
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+            check_line(line)
+            ids.append(transaction["id"])
+            lines.append(line.encode())
+
+        if not self.index.is_fresh():
+            self.index.rebuild()
+
+        with open(self.file_path, "a+b") as file:
+            offset = file.seek(0, os.SEEK_END)
+
+            # Last row was written without a line break (e.g. edited by hand)
+            if offset > 0:
+                file.seek(offset - 1)
+                if file.read(1) not in b"\r\n":
+                    file.write(b"\r\n")
+                    offset += 2
+
+            entries = []
+            for id, line in zip(ids, lines):
+                entries.append((id, offset))
+                offset += len(line)
+            file.write(b"".join(lines))
+
+        self.index.append(entries, offset)
 
     def readall(self):
         with open(self.file_path, "r", newline="") as file:
             for transaction in csv.DictReader(file):
                 yield transaction
 
-    def update(self, id, **kwargs):
+    def readall_reverse(self, block_size=1 << 16):
         """
-        Return a dict(type_old, amount_old, type_new: amount_new) of the transaction for
-        calculating user's balance
+        Yield transactions from the last row to the first. The file is read backwards in
+        blocks from the end, so reading the newest rows does not touch the older ones
         """
 
-        # Helper function for changing data fields
-        def change(transaction):
-            for key, value in kwargs.items():
-                transaction[key] = value
+        with open(self.file_path, "rb") as file:
+            position = file.seek(0, os.SEEK_END)
+            rest = b""
+            while position > 0:
+                size = min(block_size, position)
+                position -= size
+                file.seek(position)
+                lines = (file.read(size) + rest).split(b"\n")
 
-        # Return data
-        return_data = None
+                # The first line may start in the block before
+                rest = lines.pop(0)
+                for line in reversed(lines):
+                    if line.strip():
+                        yield self.to_transaction(line.rstrip(b"\r"))
 
-        # Temporary store data
-        with open(self.file_path, "r", newline="") as src, open(
-            self.tmp,
-            "w",
-            newline="",
-        ) as dst:
-            pen = csv.DictWriter(dst, fieldnames=self.FIELDNAMES)
-            pen.writeheader()
-            for transaction in csv.DictReader(src):
-                if transaction["id"] == id:
-                    return_data = {
-                        "type_old": transaction["type"],
-                        "amount_old": transaction["amount"],
-                        "type_new": kwargs.get("type", transaction["type"]),
-                        "amount_new": kwargs.get("amount", transaction["amount"]),
-                    }
-                    change(transaction)
-                pen.writerow(transaction)
+            # What is left is the header
+
+    def readall_records(self, record, batch_size=4096):
+        """
+        Yield lists of record(id, type, amount, date_time, category, note). Rows are read
+        with csv.reader (no dict per row), amount is converted to int and date_time to
+        datetime (left as stored if invalid) once
+        """
+
+        parse = datetime.datetime.fromisoformat
+
+        with open(self.file_path, "r", newline="") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+
+            batch = []
+            for id, type, amount, date_time, category, note in reader:
+                try:
+                    date_time = parse(date_time)
+                except ValueError:
+                    pass
+                batch.append(record(id, type, int(amount), date_time, category, note))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def read(self, id):
+        """
+        Return the transaction of an id (None if it does not exist) without scanning
+        """
+
+        _, offset = self.index.lookup(id)
+        if offset is None:
+            return None
+
+        with open(self.file_path, "rb") as file:
+            file.seek(offset)
+            return self.to_transaction(file.readline())
+
+    def read_page(self, after=None, limit=50):
+        """
+        Return up to limit transactions following the row of id after (from the first
+        row if after is None). The id index gives the offset to seek to, only the page is
+        read
+        """
+
+        with open(self.file_path, "rb") as file:
+            if after is None:
+                file.readline()
+            elif (offset := self.index.offset_after(after)) is not None:
+                file.seek(offset)
+            else:
+                return []
+
+            transactions = []
+            for line in file:
+                if len(transactions) == limit:
+                    break
+                if line.strip():
+                    transactions.append(self.to_transaction(line.rstrip(b"\r\n")))
+            return transactions
+
+    def last_id(self):
+        """
+        Return the greatest id ever created (None if there is no transaction): the id of
+        the last row, or of the last deleted one if it was greater. Only the end of the
+        file is read, ids are appended in increasing order
+        """
+
+        return max_id(self.last_row_id(), read_last_id(self.last_id_path))
+
+    def last_row_id(self):
+        with open(self.file_path, "rb") as file:
+            size = file.seek(0, os.SEEK_END)
+            file.seek(max(0, size - 4096))
+            lines = file.read().splitlines()
+
+        for line in reversed(lines):
+            row = next(csv.reader([line.decode()]), None)
+            if row:
+                return None if row == self.FIELDNAMES else row[0]
+        return None
+
+    def splice(self, offset, length, data):
+        """
+        Replace length bytes at offset with data. A row of the same size is overwritten
+        in place, otherwise the bytes before and after it are copied without parsing
+        """
+
+        if len(data) == length:
+            with open(self.file_path, "r+b") as file:
+                file.seek(offset)
+                file.write(data)
+            return
+
+        # shutil imports the compression modules, it is only needed here
+        import shutil
+
+        dst, tmp = open_temporary(self.tmp, "wb")
+        with open(self.file_path, "rb") as src, dst:
+            remain = offset
+            while remain > 0:
+                chunk = src.read(min(remain, 1 << 20))
+                dst.write(chunk)
+                remain -= len(chunk)
+            dst.write(data)
+            src.seek(offset + length)
+            shutil.copyfileobj(src, dst)
 
         # Write to src file
-        os.replace(self.tmp, self.file_path)
+        os.replace(tmp, self.file_path)
+
+    def update(self, id, **kwargs):
+        """
+        Return a dict(<field>_old, <field>_new) of the transaction's type, amount,
+        date_time and category for calculating user's balance and the rollups
+        """
+
+        _, offset = self.index.lookup(id)
+        if offset is None:
+            return None
+
+        with open(self.file_path, "rb") as file:
+            file.seek(offset)
+            line = file.readline()
+
+        transaction = self.to_transaction(line)
+        return_data = update_info(transaction, kwargs)
+        transaction.update(kwargs)
+
+        new_line = self.encode(transaction)
+        self.splice(offset, len(line), new_line)
+
+        # Rows after this one moved only if the size of the row changed
+        if delta := len(new_line) - len(line):
+            self.index.shift(offset, delta, os.path.getsize(self.file_path))
 
         return return_data
 
     def delete(self, id):
         """
-        Delete a transaction in the database, return a dict(type, amount) of the transaction
-        for calculating user's balance
+        Delete a transaction in the database, return a dict(type, amount, date_time,
+        category) of the transaction for calculating user's balance and the rollups
         """
 
-        # Return data
-        return_data = None
+        position, offset = self.index.lookup(id)
+        if offset is None:
+            return None
 
-        # Temporary store data
-        with open(self.file_path, "r", newline="") as src, open(
-            self.tmp,
-            "w",
-            newline="",
-        ) as dst:
-            pen = csv.DictWriter(dst, fieldnames=self.FIELDNAMES)
+        with open(self.file_path, "rb") as file:
+            file.seek(offset)
+            line = file.readline()
+
+        transaction = self.to_transaction(line)
+        if id == self.last_id():
+            write_last_id(self.last_id_path, id)
+        self.splice(offset, len(line), b"")
+        self.index.shift(
+            offset, -len(line), os.path.getsize(self.file_path), remove=position
+        )
+
+        return delete_info(transaction)
+
+    def rebuild_index(self):
+        self.index.rebuild()
+
+    def fingerprint(self):
+        """
+        Return [size, mtime] of the ledger, it changes whenever the ledger changes
+        """
+
+        return file_fingerprint(self.file_path)
+
+    def tail(self, size, length=64):
+        """
+        Return the last bytes (hex) of the first size bytes of the ledger, used to check
+        that those bytes did not change
+        """
+
+        with open(self.file_path, "rb") as file:
+            file.seek(max(0, size - length))
+            return file.read(min(size, length)).hex()
+
+    def readall_from(self, size, tail):
+        """
+        Return the rows appended after the first size bytes, None if the ledger is not
+        the same up to there (it is shorter or the tail does not match)
+        """
+
+        if os.path.getsize(self.file_path) < size or self.tail(size) != tail:
+            return None
+        return self.read_from(size)
+
+    def read_from(self, offset):
+        with open(self.file_path, "r", newline="") as file:
+            file.seek(offset)
+            for transaction in csv.DictReader(file, fieldnames=self.FIELDNAMES):
+                yield transaction
+
+
+class FixedWidthTransactionRepository:
+    """
+    Store transactions as fixed-width records, so a record can be found and changed
+    without rewriting the whole file
+
+    Record layout (bytes): <status><id><type><amount><date_time><category><note>\\n
+        - status is "+" for a live record and "-" for a deleted one (tombstone)
+        - every field is padded with spaces to its width in FIELD_WIDTHS
+        - ids are appended in increasing order, so a record is found by binary search
+    Deleted records are reclaimed by compaction, which runs in a background thread once
+    there are enough tombstones (in the deleting call when background_compaction is
+    False, e.g. when other processes share the file)
+    """
+
+    FIELDNAMES = TransactionRepository.FIELDNAMES
+    FIELD_WIDTHS = {
+        "id": 9,
+        "type": 7,
+        "amount": 15,
+        "date_time": 19,
+        "category": 32,
+        "note": 96,
+    }
+    RECORD_SIZE = 1 + sum(FIELD_WIDTHS.values()) + 1
+    LIVE = b"+"
+    DELETED = b"-"
+
+    # Compact when at least this many records, and this ratio of them, are deleted
+    COMPACTION_MIN_TOMBSTONES = 1000
+    COMPACTION_RATIO = 0.25
+
+    # Number of records read at once by readall
+    CHUNK_RECORDS = 4096
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        # Transaction history
+        self.file_path = os.path.join(database, "transactions.dat")
+        self.is_new = not os.path.exists(self.file_path)
+        if self.is_new:
+            with open(self.file_path, "wb"):
+                pass
+
+        # Id of the last record once compaction removed it, see last_id()
+        self.last_id_path = os.path.join(database, "transactions.dat.last_id")
+
+        # Temporary files
+        self.tmp = os.path.join(database, "temporary_files", "tmp.dat")
+
+        # Every file operation holds the lock, so compaction can run in a thread
+        self._lock = threading.Lock()
+        self._compaction = None
+        self._generation = 0
+
+        # Tombstones created in this session (used to trigger compaction)
+        self._tombstones = 0
+        self.background_compaction = True
+
+    def encode(self, transaction):
+        record = self.LIVE
+        for field, width in self.FIELD_WIDTHS.items():
+            value = str(transaction.get(field) or "").encode()
+            if len(value) > width:
+                raise ValueError(f"{field} is longer than {width} bytes: {value!r}")
+            record += value.ljust(width)
+        return record + b"\n"
+
+    def decode(self, record):
+        transaction = {}
+        start = 1
+        for field, width in self.FIELD_WIDTHS.items():
+            transaction[field] = record[start : start + width].decode().rstrip()
+            start += width
+        return transaction
+
+    def create(self, transaction):
+        self.import_transactions([transaction])
+
+    def import_transactions(self, transactions):
+        """
+        Append many transactions with a single buffered write
+        """
+
+        records = b"".join(self.encode(transaction) for transaction in transactions)
+        with self._lock, open(self.file_path, "ab") as file:
+            file.write(records)
+
+    def readall(self):
+        # Read in chunks and release the lock between them. If a compaction moved the
+        # records meanwhile, continue after the last id that was read
+        offset = 0
+        last_id = None
+        generation = self._generation
+        while True:
+            with self._lock, open(self.file_path, "rb") as file:
+                if generation != self._generation and last_id is not None:
+                    offset = self.bisect(file, int(last_id) + 1) * self.RECORD_SIZE
+                generation = self._generation
+                file.seek(offset)
+                records = file.read(self.RECORD_SIZE * self.CHUNK_RECORDS)
+
+            if not records:
+                return
+            offset += len(records)
+
+            for start in range(0, len(records), self.RECORD_SIZE):
+                record = records[start : start + self.RECORD_SIZE]
+                last_id = record[1 : 1 + self.FIELD_WIDTHS["id"]]
+                if record[:1] == self.LIVE:
+                    yield self.decode(record)
+
+    def readall_reverse(self):
+        """
+        Yield transactions from the last record to the first, in chunks read from the
+        end of the file. If a compaction moved the records meanwhile, continue before the
+        last id that was read
+        """
+
+        offset = None
+        last_id = None
+        generation = self._generation
+        while offset != 0:
+            with self._lock, open(self.file_path, "rb") as file:
+                if offset is None:
+                    offset = file.seek(0, os.SEEK_END) // self.RECORD_SIZE
+                    offset *= self.RECORD_SIZE
+                elif generation != self._generation and last_id is not None:
+                    offset = self.bisect(file, int(last_id)) * self.RECORD_SIZE
+                generation = self._generation
+
+                start = max(0, offset - self.RECORD_SIZE * self.CHUNK_RECORDS)
+                file.seek(start)
+                records = file.read(offset - start)
+            offset = start
+
+            for start in range(len(records) - self.RECORD_SIZE, -1, -self.RECORD_SIZE):
+                record = records[start : start + self.RECORD_SIZE]
+                last_id = record[1 : 1 + self.FIELD_WIDTHS["id"]]
+                if record[:1] == self.LIVE:
+                    yield self.decode(record)
+
+    def read_page(self, after=None, limit=50):
+        """
+        Return up to limit transactions following the record of id after (from the first
+        record if after is None), found by binary search
+        """
+
+        transactions = []
+        with self._lock, open(self.file_path, "rb") as file:
+            if after is not None:
+                file.seek(self.bisect(file, int(after) + 1) * self.RECORD_SIZE)
+            while len(transactions) < limit:
+                records = file.read(self.RECORD_SIZE * self.CHUNK_RECORDS)
+                if not records:
+                    break
+                for start in range(0, len(records), self.RECORD_SIZE):
+                    record = records[start : start + self.RECORD_SIZE]
+                    if record[:1] == self.LIVE and len(transactions) < limit:
+                        transactions.append(self.decode(record))
+        return transactions
+
+    def read(self, id):
+        with self._lock, open(self.file_path, "rb") as file:
+            if (offset := self.locate(file, id)) is None:
+                return None
+            file.seek(offset)
+            return self.decode(file.read(self.RECORD_SIZE))
+
+    def last_id(self):
+        """
+        Return the greatest id ever created (None if there is no transaction): the id of
+        the last record, deleted or not, or the one saved when compaction removed it
+        """
+
+        with self._lock, open(self.file_path, "rb") as file:
+            size = file.seek(0, os.SEEK_END)
+            last_id = None
+            if size >= self.RECORD_SIZE:
+                file.seek(size - self.RECORD_SIZE + 1)
+                last_id = file.read(self.FIELD_WIDTHS["id"]).decode().rstrip()
+        return max_id(last_id, read_last_id(self.last_id_path))
+
+    def bisect(self, file, id):
+        """
+        Return the index of the first record whose id is not less than the given id. The
+        caller must hold the lock
+        """
+
+        low, high = 0, file.seek(0, os.SEEK_END) // self.RECORD_SIZE
+        while low < high:
+            middle = (low + high) // 2
+            file.seek(middle * self.RECORD_SIZE + 1)
+            if int(file.read(self.FIELD_WIDTHS["id"])) < id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def locate(self, file, id):
+        """
+        Return the offset of the live record of an id (None if it does not exist or was
+        deleted). The caller must hold the lock
+        """
+
+        offset = self.bisect(file, int(id)) * self.RECORD_SIZE
+        file.seek(offset)
+        record = file.read(1 + self.FIELD_WIDTHS["id"])
+        if record[:1] == self.LIVE and int(record[1:]) == int(id):
+            return offset
+        return None
+
+    def update(self, id, **kwargs):
+        """
+        Return a dict(<field>_old, <field>_new) of the transaction's type, amount,
+        date_time and category for calculating user's balance and the rollups
+        """
+
+        with self._lock, open(self.file_path, "r+b") as file:
+            if (offset := self.locate(file, id)) is None:
+                return None
+
+            file.seek(offset)
+            transaction = self.decode(file.read(self.RECORD_SIZE))
+            return_data = update_info(transaction, kwargs)
+            transaction.update(kwargs)
+
+            # Same record size, so only this record is overwritten
+            record = self.encode(transaction)
+            file.seek(offset)
+            file.write(record)
+
+        return return_data
+
+    def delete(self, id):
+        """
+        Mark a transaction as deleted, return a dict(type, amount) of the transaction for
+        calculating user's balance
+        """
+
+        with self._lock, open(self.file_path, "r+b") as file:
+            if (offset := self.locate(file, id)) is None:
+                return None
+
+            file.seek(offset)
+            transaction = self.decode(file.read(self.RECORD_SIZE))
+
+            # Only the status byte is overwritten
+            file.seek(offset)
+            file.write(self.DELETED)
+
+            size = file.seek(0, os.SEEK_END)
+
+        self._tombstones += 1
+        if (
+            self._tombstones >= self.COMPACTION_MIN_TOMBSTONES
+            and self._tombstones >= size // self.RECORD_SIZE * self.COMPACTION_RATIO
+        ):
+            if self.background_compaction:
+                self.compact_in_background()
+            else:
+                self.compact()
+
+        return delete_info(transaction)
+
+    def compact(self):
+        """
+        Rewrite the file without deleted records
+        """
+
+        with self._lock:
+            dst, tmp = open_temporary(self.tmp, "wb")
+            last = None
+            with open(self.file_path, "rb") as src, dst:
+                while record := src.read(self.RECORD_SIZE):
+                    if record[:1] == self.LIVE:
+                        dst.write(record)
+                    last = record
+
+            # The last record is removed, its id must not be created again
+            if last is not None and last[:1] == self.DELETED:
+                write_last_id(self.last_id_path, self.decode(last)["id"])
+
+            # Write to src file
+            os.replace(tmp, self.file_path)
+            self._tombstones = 0
+            self._generation += 1
+
+    def fingerprint(self):
+        return file_fingerprint(self.file_path)
+
+    def compact_in_background(self):
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+
+        self._compaction = threading.Thread(target=self.compact, daemon=True)
+        self._compaction.start()
+
+
+class SqliteTransactionRepository:
+    """
+    Store transactions in a SQLite database with indexes on the filtered fields, so the
+    filters are index lookups instead of full scans
+    """
+
+    FIELDNAMES = TransactionRepository.FIELDNAMES
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        # Transaction history
+        self.file_path = os.path.join(database, "transactions.db")
+        self.is_new = not os.path.exists(self.file_path)
+
+        # Imported here, the other storages do not need it
+        import sqlite3
+
+        # The server creates the repository in the main thread and uses it from its
+        # worker thread (one thread at a time)
+        self.connection = sqlite3.connect(self.file_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    amount INTEGER NOT NULL,
+                    date_time TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    note TEXT NOT NULL DEFAULT ''
+                )
+                """
+            )
+            for field in ["type", "category", "date_time", "amount"]:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS transactions_{field} "
+                    f"ON transactions ({field})"
+                )
+
+            # Id of the last transaction once it was deleted, see last_id()
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS last_id (id INTEGER NOT NULL)"
+            )
+
+    def to_row(self, transaction):
+        return (
+            transaction["id"],
+            transaction["type"],
+            int(transaction["amount"]),
+            transaction["date_time"],
+            transaction["category"],
+            transaction.get("note") or "",
+        )
+
+    def select(self, condition="1", parameters=(), order="id", limit=-1):
+        """
+        Yield transactions in the same format as the csv repository (all values are str)
+        """
+
+        cursor = self.connection.execute(
+            f"SELECT id, type, amount, date_time, category, note FROM transactions "
+            f"WHERE {condition} ORDER BY {order} LIMIT ?",
+            (*parameters, limit),
+        )
+        for row in cursor:
+            transaction = dict(zip(self.FIELDNAMES, row))
+            transaction["amount"] = str(transaction["amount"])
+            yield transaction
+
+    def create(self, transaction):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                self.to_row(transaction),
+            )
+
+    def import_transactions(self, transactions):
+        """
+        Insert many transactions in a single database transaction
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                map(self.to_row, transactions),
+            )
+
+    def readall(self):
+        return self.select()
+
+    def readall_reverse(self):
+        return self.select(order="id DESC")
+
+    def read_page(self, after=None, limit=50):
+        """
+        Return up to limit transactions following the row of id after (from the first
+        row if after is None), found with the primary key
+        """
+
+        if after is None:
+            return list(self.select(limit=limit))
+        # Ids are compared as text, the cursor is zero-padded like them (e.g. 2 is
+        # 000000002) so the primary key can still be used
+        after = f"{int(after):09d}"
+        return list(self.select("id > ?", (after,), limit=limit))
+
+    def read(self, id):
+        return next(self.select("id = ?", (id,)), None)
+
+    def last_id(self):
+        """
+        Return the greatest id ever created (None if there is no transaction), deleted
+        transactions included
+        """
+
+        row = self.connection.execute(
+            "SELECT MAX(id) FROM ("
+            "SELECT MAX(CAST(id AS INTEGER)) AS id FROM transactions "
+            "UNION ALL SELECT id FROM last_id)"
+        ).fetchone()
+        return None if row[0] is None else str(row[0])
+
+    def update(self, id, **kwargs):
+        """
+        Return a dict(<field>_old, <field>_new) of the transaction's type, amount,
+        date_time and category for calculating user's balance and the rollups
+        """
+
+        if (transaction := self.read(id)) is None:
+            return None
+
+        for field in kwargs:
+            if field not in self.FIELDNAMES:
+                raise ValueError(f"Unknown field: {field}")
+
+        if kwargs:
+            assignments = ", ".join(f"{field} = ?" for field in kwargs)
+            with self.connection:
+                self.connection.execute(
+                    f"UPDATE transactions SET {assignments} WHERE id = ?",
+                    (*kwargs.values(), id),
+                )
+
+        return update_info(transaction, kwargs)
+
+    def delete(self, id):
+        """
+        Delete a transaction in the database, return a dict(type, amount, date_time,
+        category) of the transaction for calculating user's balance and the rollups
+        """
+
+        if (transaction := self.read(id)) is None:
+            return None
+
+        with self.connection:
+            if id.isdigit() and str(int(id)) == self.last_id():
+                self.connection.execute("DELETE FROM last_id")
+                self.connection.execute("INSERT INTO last_id VALUES (?)", (int(id),))
+            self.connection.execute("DELETE FROM transactions WHERE id = ?", (id,))
+
+        return delete_info(transaction)
+
+    def fingerprint(self):
+        return file_fingerprint(self.file_path)
+
+    def filter_by_category(self, category):
+        return self.select("category = ?", (category,))
+
+    def filter_by_date_range(self, start_date, end_date):
+        return self.select("date_time BETWEEN ? AND ?", (start_date, end_date))
+
+    def filter_by_type(self, type):
+        return self.select("type = ?", (type,))
+
+    def filter_by_amount_range(self, min_amount, max_amount):
+        return self.select("amount BETWEEN ? AND ?", (int(min_amount), int(max_amount)))
+
+    def query(self, predicates, matches):
+        """
+        Filter on many fields in one SELECT (SQLite picks the index), predicates is a
+        dict of category, type, start_date, end_date, min_amount, max_amount
+        """
+
+        conditions = {
+            "category": "category = ?",
+            "type": "type = ?",
+            "start_date": "date_time >= ?",
+            "end_date": "date_time <= ?",
+            "min_amount": "amount >= ?",
+            "max_amount": "amount <= ?",
+        }
+        condition = " AND ".join(conditions[field] for field in predicates) or "1"
+        return self.select(condition, tuple(predicates.values()))
+
+
+class PartitionedTransactionRepository:
+    """
+    Store transactions in one csv file per month (database/transactions/YYYY-MM.csv), so
+    date range queries only open the months that overlap the range
+
+    The manifest (database/transactions/manifest.json) keeps, for each month, the number
+    of rows and the smallest and largest id in it, plus the last id ever created
+    """
+
+    FIELDNAMES = TransactionRepository.FIELDNAMES
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        # Transaction history
+        self.folder = os.path.join(database, "transactions")
+        self.manifest_path = os.path.join(self.folder, "manifest.json")
+        self.is_new = not os.path.exists(self.manifest_path)
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+
+        # Temporary files
+        self.tmp = os.path.join(database, "temporary_files", "tmp.csv")
+
+        if self.is_new:
+            self.manifest = {"partitions": {}, "last_id": None}
+            self.save_manifest()
+        else:
+            self.reload()
+
+    def reload(self):
+        """
+        Read the manifest again (another process changed the ledger)
+        """
+
+        with open(self.manifest_path, "r") as file:
+            self.manifest = json.load(file)
+
+    def save_manifest(self):
+        file, tmp = open_temporary(self.tmp)
+        with file:
+            json.dump(self.manifest, file, indent=4)
+        os.replace(tmp, self.manifest_path)
+
+    def partition_path(self, month):
+        return os.path.join(self.folder, f"{month}.csv")
+
+    def partitions(self, start_date=None, end_date=None):
+        """
+        Return the months (sorted) that overlap the date range, all months by default
+        """
+
+        months = sorted(self.manifest["partitions"])
+        if start_date is not None:
+            months = [month for month in months if month >= start_date[:7]]
+        if end_date is not None:
+            months = [month for month in months if month <= end_date[:7]]
+        return months
+
+    def read_partition(self, month):
+        with open(self.partition_path(month), "r", newline="") as file:
+            for transaction in csv.DictReader(file):
+                yield transaction
+
+    def write_partition(self, month, transactions):
+        file, tmp = open_temporary(self.tmp, newline="")
+        with file:
+            pen = csv.DictWriter(file, fieldnames=self.FIELDNAMES)
             pen.writeheader()
-            for transaction in csv.DictReader(src):
-                if transaction["id"] != id:
-                    pen.writerow(transaction)
-                else:
-                    return_data = {
-                        "type": transaction["type"],
-                        "amount": transaction["amount"],
-                    }
+            pen.writerows(transactions)
+        os.replace(tmp, self.partition_path(month))
 
-        # Write to src file
-        os.replace(self.tmp, self.file_path)
+    def find(self, id):
+        """
+        Return (month, transaction) of an id, (None, None) if it does not exist. Only the
+        months whose id range contains the id are scanned
+        """
+
+        if not id.isdigit():
+            return None, None
+
+        for month, info in self.manifest["partitions"].items():
+            if info["min_id"] <= int(id) <= info["max_id"]:
+                for transaction in self.read_partition(month):
+                    if transaction["id"] == id:
+                        return month, transaction
+        return None, None
+
+    def import_transactions(self, transactions):
+        """
+        Append transactions to their months, the manifest is saved once at the end
+        """
+
+        by_month = {}
+        for transaction in transactions:
+            by_month.setdefault(transaction["date_time"][:7], []).append(transaction)
+
+        for month, rows in by_month.items():
+            path = self.partition_path(month)
+            is_new = not os.path.exists(path)
+            with open(path, "a", newline="") as file:
+                pen = csv.DictWriter(file, fieldnames=self.FIELDNAMES)
+                if is_new:
+                    pen.writeheader()
+                pen.writerows(rows)
+
+            info = self.manifest["partitions"].setdefault(
+                month, {"count": 0, "min_id": None, "max_id": None}
+            )
+            for row in rows:
+                id = int(row["id"])
+                info["count"] += 1
+                if info["min_id"] is None or id < info["min_id"]:
+                    info["min_id"] = id
+                if info["max_id"] is None or id > info["max_id"]:
+                    info["max_id"] = id
+
+                last_id = self.manifest["last_id"]
+                if last_id is None or id > int(last_id):
+                    self.manifest["last_id"] = row["id"]
+
+        self.save_manifest()
+
+    def create(self, transaction):
+        self.import_transactions([transaction])
+
+    def readall(self):
+        for month in self.partitions():
+            yield from self.read_partition(month)
+
+    def readall_reverse(self):
+        # Only one month is in memory at a time
+        for month in reversed(self.partitions()):
+            yield from reversed(list(self.read_partition(month)))
+
+    def read(self, id):
+        return self.find(id)[1]
+
+    def last_id(self):
+        return self.manifest["last_id"]
+
+    def remove(self, month, id):
+        transactions = [t for t in self.read_partition(month) if t["id"] != id]
+        if transactions:
+            self.write_partition(month, transactions)
+            self.manifest["partitions"][month]["count"] = len(transactions)
+        else:
+            os.remove(self.partition_path(month))
+            del self.manifest["partitions"][month]
+
+    def update(self, id, **kwargs):
+        """
+        Return a dict(<field>_old, <field>_new) of the transaction's type, amount,
+        date_time and category for calculating user's balance and the rollups
+        """
+
+        month, transaction = self.find(id)
+        if transaction is None:
+            return None
+
+        return_data = update_info(transaction, kwargs)
+        transaction.update(kwargs)
+
+        if transaction["date_time"][:7] == month:
+            transactions = list(self.read_partition(month))
+            for index, row in enumerate(transactions):
+                if row["id"] == id:
+                    transactions[index] = transaction
+            self.write_partition(month, transactions)
+        else:
+            # Moved to another month
+            self.remove(month, id)
+            self.import_transactions([transaction])
+        self.save_manifest()
 
         return return_data
 
+    def delete(self, id):
+        """
+        Delete a transaction in the database, return a dict(type, amount, date_time,
+        category) of the transaction for calculating user's balance and the rollups
+        """
+
+        month, transaction = self.find(id)
+        if transaction is None:
+            return None
+
+        self.remove(month, id)
+        self.save_manifest()
+
+        return delete_info(transaction)
+
+    def fingerprint(self):
+        # The manifest is rewritten on every write
+        return file_fingerprint(self.manifest_path)
+
+    def filter_by_date_range(self, start_date, end_date):
+        for month in self.partitions(start_date, end_date):
+            for transaction in self.read_partition(month):
+                if start_date <= transaction["date_time"] <= end_date:
+                    yield transaction
+
+    def query(self, predicates, matches):
+        """
+        Filter on many fields: only the months of the date range (start_date, end_date
+        in predicates) are read, matches(transaction) checks the rows
+        """
+
+        start_date, end_date = predicates.get("start_date"), predicates.get("end_date")
+        for month in self.partitions(start_date, end_date):
+            for transaction in self.read_partition(month):
+                if matches(transaction):
+                    yield transaction
+
+
+class WriteAheadLog:
+    """
+    Append-only log of transaction writes (database/wal.log), one JSON object per line
+
+    Every append is fsynced before it returns, so a write is durable once it is
+    acknowledged. Group commit comes from the callers: the entries of a batch
+    (Controller.save_transactions, the server's WriteBatcher) share one append and one
+    fsync
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = open(self.file_path, "ab")
+
+    def entries(self):
+        """
+        Return the logged entries. A torn last line (crash while writing) is ignored
+        """
+
+        entries = []
+        with open(self.file_path, "rb") as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+        return entries
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        self.file.write(
+            b"".join(json.dumps(entry).encode() + b"\n" for entry in entries)
+        )
+        self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def truncate(self):
+        self.file.truncate(0)
+        self.sync()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+class WalTransactionRepository:
+    """
+    Log transaction writes to a WriteAheadLog and apply them to the ledger (another
+    transaction repository) in batches
+
+    Writes pending in the log are applied (checkpointed) when checkpoint_every writes
+    are pending, before any read of the ledger, and at exit. Applying a log twice gives
+    the same ledger (creates already in the ledger are skipped), so a log left by a
+    crash is replayed on the next start
+
+    Entries are checked before they are logged: a write the ledger would reject (e.g.
+    a note too long for the fixed-width storage) raises here instead of failing every
+    later checkpoint
+    """
+
+    # Reads that need the pending writes in the ledger first
+    READS = [
+        "readall",
+        "readall_reverse",
+        "read_page",
+        "filter_by_category",
+        "filter_by_date_range",
+        "filter_by_type",
+        "filter_by_amount_range",
+        "query",
+    ]
+
+    def __init__(self, repository, wal, checkpoint_every=1000):
+        self.repository = repository
+        self.wal = wal
+        self.checkpoint_every = checkpoint_every
+
+        # Writes in the log that are not in the ledger yet
+        self.pending = wal.entries()
+
+        # Last id of the ledger plus the pending writes
+        self._last_id = repository.last_id()
+        for entry in self.pending:
+            if entry["op"] == "create" and (
+                self._last_id is None
+                or int(entry["transaction"]["id"]) > int(self._last_id)
+            ):
+                self._last_id = entry["transaction"]["id"]
+
+        # Functions called after each checkpoint (the ledger changed)
+        self.on_checkpoint = []
+
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        if name in self.READS and hasattr(self.repository, name):
+            def read(*args):
+                self.checkpoint()
+                return getattr(self.repository, name)(*args)
+
+            return read
+        raise AttributeError(name)
+
+    def check(self, entry):
+        """
+        Raise ValueError if the ledger cannot store the write of an entry
+        """
+
+        if not hasattr(self.repository, "encode"):
+            return
+        match entry["op"]:
+            case "create":
+                self.repository.encode(entry["transaction"])
+            case "update":
+                self.repository.encode({**self.read(entry["id"]), **entry["fields"]})
+
+    def log(self, *entries):
+        for entry in entries:
+            self.check(entry)
+        self.wal.append_many(entries)
+        self.pending.extend(entries)
+        if len(self.pending) >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Apply the pending writes to the ledger, then empty the log
+        """
+
+        if not self.pending:
+            return
+
+        last_id = self.repository.last_id()
+        last_id = int(last_id) if last_id is not None else 0
+        creates = []
+
+        def flush_creates():
+            if not creates:
+                return
+            if hasattr(self.repository, "import_transactions"):
+                self.repository.import_transactions(creates)
+            else:
+                for transaction in creates:
+                    self.repository.create(transaction)
+            creates.clear()
+
+        for entry in self.pending:
+            match entry["op"]:
+                case "create":
+                    # Skip creates that already reached the ledger
+                    if int(entry["transaction"]["id"]) > last_id:
+                        creates.append(entry["transaction"])
+                case "update":
+                    flush_creates()
+                    self.repository.update(entry["id"], **entry["fields"])
+                case "delete":
+                    flush_creates()
+                    self.repository.delete(entry["id"])
+        flush_creates()
+
+        self.wal.truncate()
+        self.pending = []
+
+        for function in self.on_checkpoint:
+            function()
+
+    def close(self):
+        self.checkpoint()
+        self.wal.close()
+
+    def create(self, transaction):
+        self.import_transactions([transaction])
+
+    def import_transactions(self, transactions):
+        entries = [
+            {"op": "create", "transaction": dict(transaction)}
+            for transaction in transactions
+        ]
+        self.log(*entries)
+        for entry in entries:
+            id = entry["transaction"]["id"]
+            if self._last_id is None or int(id) > int(self._last_id):
+                self._last_id = id
+
+    def read(self, id):
+        """
+        Return the transaction of an id as it is in the ledger plus the pending writes
+        """
+
+        transaction = self.repository.read(id)
+        for entry in self.pending:
+            match entry["op"]:
+                case "create" if entry["transaction"]["id"] == id:
+                    transaction = dict(entry["transaction"])
+                case "update" if entry["id"] == id and transaction is not None:
+                    transaction = {**transaction, **entry["fields"]}
+                case "delete" if entry["id"] == id:
+                    transaction = None
+        return transaction
+
+    def last_id(self):
+        return self._last_id
+
+    def update(self, id, **kwargs):
+        """
+        Return a dict(<field>_old, <field>_new) of the transaction's type, amount,
+        date_time and category for calculating user's balance and the rollups
+        """
+
+        if (transaction := self.read(id)) is None:
+            return None
+
+        self.log({"op": "update", "id": id, "fields": kwargs})
+        return update_info(transaction, kwargs)
+
+    def delete(self, id):
+        """
+        Delete a transaction in the database, return a dict(type, amount, date_time,
+        category) of the transaction for calculating user's balance and the rollups
+        """
+
+        if (transaction := self.read(id)) is None:
+            return None
+
+        self.log({"op": "delete", "id": id})
+        return delete_info(transaction)
+
+    def fingerprint(self):
+        # Changes with every logged write, without applying the log
+        return self.repository.fingerprint() + [len(self.pending)]
+
+
+class LockedTransactionRepository:
+    """
+    Run the calls to a transaction repository under a LedgerLock, so processes sharing
+    the database folder do not interleave writes or read a half-written ledger
+
+    Writes hold the lock exclusively and bump the ledger version, everything else holds
+    it shared (generators until they are exhausted or closed). Repositories that keep
+    state in memory (reload method) reload it when the version changed. Compaction of
+    the fixed-width storage runs in the delete that triggers it, under its exclusive
+    lock, instead of in a thread that would only hold the repository's thread lock
+    """
+
+    WRITES = ["create", "import_transactions", "update", "delete"]
+
+    def __init__(self, repository, lock):
+        self.repository = repository
+        self.lock = lock
+        self.version = lock.version()
+
+        if hasattr(repository, "background_compaction"):
+            repository.background_compaction = False
+
+    def __getattr__(self, name):
+        attribute = getattr(self.repository, name)
+        if not callable(attribute):
+            return attribute
+
+        if name in self.WRITES:
+            def write(*args, **kwargs):
+                with self.lock.exclusive():
+                    self.sync()
+                    result = attribute(*args, **kwargs)
+                    self.version = self.lock.bump()
+                return result
+
+            return write
+
+        def read(*args, **kwargs):
+            with self.lock.shared():
+                self.sync()
+                result = attribute(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                return self.hold(result)
+            return result
+
+        return read
+
+    def sync(self):
+        version = self.lock.version()
+        if version != self.version:
+            if hasattr(self.repository, "reload"):
+                self.repository.reload()
+            self.version = version
+
+    def hold(self, generator):
+        with self.lock.shared():
+            yield from generator
+
 
 class CategoryRepository:
     DEFAULT = [
@@ -135,7 +1540,8 @@ class CategoryRepository:
 
     def delete(self, name):
         # Temporary store data
-        with open(self.file_path, "r") as src, open(self.tmp, "w") as dst:
+        dst, tmp = open_temporary(self.tmp)
+        with open(self.file_path, "r") as src, dst:
             for category in src:
                 category = category.strip()
                 if category != name:
@@ -143,7 +1549,273 @@ class CategoryRepository:
 
         # Change name and directory of the tmp file to the main file, then delete
         # the main file
-        os.replace(self.tmp, self.file_path)
+        os.replace(tmp, self.file_path)
+
+
+class CheckpointRepository:
+    """
+    Persist the user's totals (database/checkpoint.json) so they are not recomputed from
+    the whole ledger at startup
+    """
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        self.file_path = os.path.join(database, "checkpoint.json")
+
+        # Temporary files
+        self.tmp = os.path.join(database, "temporary_files", "checkpoint.json")
+
+    def read(self):
+        """
+        Return the checkpoint, None if it does not exist or is corrupt
+        """
+
+        try:
+            with open(self.file_path, "r") as file:
+                checkpoint = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        keys = ["transaction_count", "income", "expense", "fingerprint"]
+        if not isinstance(checkpoint, dict) or any(
+            key not in checkpoint for key in keys
+        ):
+            return None
+        return checkpoint
+
+    def save(self, checkpoint):
+        file, tmp = open_temporary(self.tmp)
+        with file:
+            # json.dumps encodes in C, json.dump does not
+            file.write(json.dumps(checkpoint))
+        os.replace(tmp, self.file_path)
+
+
+class RollupRepository:
+    """
+    Persist the rollups (database/rollups.json), totals per day and month and sketches
+    of the amounts, updated on every write instead of recomputed from the whole ledger
+    """
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        self.file_path = os.path.join(database, "rollups.json")
+
+        # Temporary files
+        self.tmp = os.path.join(database, "temporary_files", "rollups.json")
+
+    def read(self):
+        """
+        Return the rollups, None if they do not exist or are corrupt
+        """
+
+        try:
+            with open(self.file_path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        keys = ["daily", "monthly", "sketches", "fingerprint"]
+        if not isinstance(data, dict) or any(key not in data for key in keys):
+            return None
+        return data
+
+    def save(self, data):
+        file, tmp = open_temporary(self.tmp)
+        with file:
+            file.write(json.dumps(data))
+        os.replace(tmp, self.file_path)
+
+
+# Fields of a changed transaction that the user's totals and the rollups depend on
+CHANGE_FIELDS = ["type", "amount", "date_time", "category"]
+
+
+def check_line(line):
+    """
+    Raise ValueError if a csv row (ending with its line break) spans several lines
+    """
+
+    if "\n" in line[:-2] or "\r" in line[:-2]:
+        raise ValueError(f"Fields cannot contain line breaks: {line[:-2]!r}")
+
+
+def update_info(transaction, kwargs):
+    """
+    Return a dict(<field>_old, <field>_new) of the CHANGE_FIELDS of a transaction
+    updated with kwargs (all values are str)
+    """
+
+    info = {}
+    for field in CHANGE_FIELDS:
+        info[f"{field}_old"] = str(transaction[field])
+        info[f"{field}_new"] = str(kwargs.get(field, transaction[field]))
+    return info
+
+
+def delete_info(transaction):
+    return {field: str(transaction[field]) for field in CHANGE_FIELDS}
+
+
+def read_last_id(path):
+    """
+    Return the id saved by write_last_id, None if there is none
+    """
+
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return file.read().strip() or None
+
+
+def write_last_id(path, id):
+    file, tmp = open_temporary(path)
+    with file:
+        file.write(id)
+    os.replace(tmp, path)
+
+
+def max_id(*ids):
+    """
+    Return the greatest of ids (None are skipped), compared as numbers when they are
+    """
+
+    ids = [id for id in ids if id is not None]
+    return max(
+        ids, key=lambda id: (id.isdigit(), int(id) if id.isdigit() else 0), default=None
+    )
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+DEFAULT_CONFIG = {
+    # Transaction storage: "csv" (transactions.csv), "fixed" (transactions.dat),
+    # "sqlite" (transactions.db) or "partitioned" (transactions/<YYYY-MM>.csv). The
+    # sqlite and partitioned storages are migrated from transactions.csv when created
+    "storage": "csv",
+    # Read typed records instead of dicts for scans that only aggregate (statistics)
+    "fast_reader": True,
+    # Write-ahead log: writes are appended to wal.log and applied to the storage every
+    # wal_checkpoint_every writes (and before reads). The log is fsynced before each
+    # write returns, a batch of writes shares one fsync. Single process only, needs
+    # locking set to false
+    "wal": False,
+    "wal_checkpoint_every": 1000,
+    # Keep the parsed ledger in memory between commands, reloaded when the storage
+    # changes. Ledgers with more than cache_max_rows transactions (0: no limit) are
+    # not cached
+    "cache": True,
+    "cache_max_rows": 5000000,
+    # Lock the ledger (database/ledger.lock) so several processes can use the same
+    # database: writes are exclusive, reads are shared
+    "locking": True,
+}
+
+
+def load_config():
+    """
+    Return the config in database/config.json, missing keys take the default values
+    """
+
+    current_folder = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.dirname(current_folder)
+    path = os.path.join(root, "database", "config.json")
+
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            config.update(json.load(file))
+    return config
+
+
+def open_transaction_repository(config):
+    # The write-ahead log keeps pending writes in memory and truncates the log at a
+    # checkpoint, which would lose the writes other processes logged meanwhile
+    if config["wal"] and config["locking"]:
+        raise ValueError("wal cannot be used with locking, set one of them to false")
+
+    repository = open_ledger(config)
+    if config["wal"]:
+        repository = WalTransactionRepository(
+            repository,
+            WriteAheadLog(wal_path()),
+            config["wal_checkpoint_every"],
+        )
+
+    if config["locking"]:
+        repository = LockedTransactionRepository(repository, locks.LedgerLock())
+    return repository
+
+
+def open_ledger(config):
+    match config["storage"]:
+        case "csv":
+            return TransactionRepository()
+        case "fixed":
+            repository = FixedWidthTransactionRepository()
+            # One-shot migration of the existing history when the file is created
+            if repository.is_new:
+                migrate_csv(repository)
+            return repository
+        case "sqlite":
+            repository = SqliteTransactionRepository()
+            if repository.is_new:
+                migrate_csv(repository)
+            return repository
+        case "partitioned":
+            repository = PartitionedTransactionRepository()
+            if repository.is_new:
+                migrate_csv(repository)
+            return repository
+        case _:
+            raise ValueError(f"Unknown storage: {config['storage']}")
+
+
+def wal_path():
+    current_folder = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.dirname(current_folder)
+    return os.path.join(root, "database", "wal.log")
+
+
+def recover_wal(config):
+    """
+    Apply the writes left in the write-ahead log (e.g. after a crash) to the ledger
+    """
+
+    if not os.path.exists(wal_path()) or os.path.getsize(wal_path()) == 0:
+        return
+
+    repository = WalTransactionRepository(
+        open_ledger(config), WriteAheadLog(wal_path())
+    )
+    repository.close()
+
+
+def migrate_csv(repository):
+    """
+    Copy the transactions in transactions.csv to another transaction repository
+    """
+
+    source = TransactionRepository()
+    if not os.path.exists(source.file_path):
+        return
+
+    if hasattr(repository, "import_transactions"):
+        repository.import_transactions(source.readall())
+    else:
+        for transaction in source.readall():
+            repository.create(transaction)
 
 
 def initialize_database():
@@ -191,12 +1863,22 @@ def initialize_database():
             for cat in CategoryRepository.DEFAULT:
                 file.write(cat + "\n")
 
+    # Initialize default config
+    config = os.path.join(database, "config.json")
+    if not os.path.exists(config):
+        with open(config, "w") as file:
+            json.dump(DEFAULT_CONFIG, file, indent=4)
+
+    # Recover writes left in the write-ahead log
+    recover_wal(load_config())
+
     # Return path (for reusability)
     return {
         "root": root,
         "database": database,
         "transactions": transactions,
         "categories": categories,
+        "config": config,
         "temporary_files": temporary_files,
         "tmp_csv": tmp_csv,
         "tmp_txt": tmp_txt,
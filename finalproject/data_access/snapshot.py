@@ -0,0 +1,149 @@
+import array
+import datetime
+import json
+import os
+
+
+class ColumnarSnapshot:
+    """
+    Columnar copy of the ledger for analytics, stored as NumPy arrays in
+    database/snapshot/ and memory-mapped when loaded
+
+    Columns:
+        - amount: int64
+        - type: int8 (see TYPES)
+        - category: int32 code, the names are in meta.json
+        - epoch: int64 seconds of date_time (0 if date_time is invalid)
+    meta.json also keeps the fingerprint of the ledger the snapshot was taken from, the
+    snapshot is only used while the ledger has not changed since then
+
+    NumPy is only imported when a snapshot is refreshed or loaded
+    """
+
+    COLUMNS = ["amount", "type", "category", "epoch"]
+    TYPES = ["income", "expense"]
+
+    def __init__(self):
+        # Get database root path
+        current_folder = os.path.dirname(os.path.abspath(__file__))
+        root = os.path.dirname(current_folder)
+        database = os.path.join(root, "database")
+
+        self.folder = os.path.join(database, "snapshot")
+        self.meta_path = os.path.join(self.folder, "meta.json")
+
+        # Loaded columns and meta
+        self.columns = None
+        self.meta = None
+
+    def column_path(self, column):
+        return os.path.join(self.folder, f"{column}.npy")
+
+    def read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        try:
+            with open(self.meta_path, "r") as file:
+                return json.load(file)
+        except ValueError:
+            return None
+
+    def is_fresh(self, fingerprint):
+        meta = self.meta if self.meta is not None else self.read_meta()
+        return meta is not None and meta["fingerprint"] == fingerprint
+
+    def refresh(self, transactions, fingerprint):
+        """
+        Rebuild the snapshot from a stream of transactions, return the number of rows
+        """
+
+        import numpy
+
+        amounts = array.array("q")
+        types = array.array("b")
+        categories = array.array("i")
+        epochs = array.array("q")
+        category_codes = {}
+
+        for transaction in transactions:
+            amounts.append(int(transaction["amount"]))
+            types.append(self.TYPES.index(transaction["type"]))
+            categories.append(
+                category_codes.setdefault(transaction["category"], len(category_codes))
+            )
+            epochs.append(to_epoch(transaction["date_time"]))
+
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+
+        # Columns first, meta last: a snapshot without matching meta is never used
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        self.columns = None
+        self.meta = None
+        for column, values, dtype in [
+            ("amount", amounts, numpy.int64),
+            ("type", types, numpy.int8),
+            ("category", categories, numpy.int32),
+            ("epoch", epochs, numpy.int64),
+        ]:
+            numpy.save(self.column_path(column), numpy.frombuffer(values, dtype=dtype))
+
+        with open(self.meta_path, "w") as file:
+            json.dump(
+                {
+                    "fingerprint": fingerprint,
+                    "rows": len(amounts),
+                    "categories": list(category_codes),
+                },
+                file,
+            )
+
+        return len(amounts)
+
+    def load(self):
+        import numpy
+
+        if self.columns is None or self.meta != self.read_meta():
+            self.meta = self.read_meta()
+            self.columns = {
+                column: numpy.load(self.column_path(column), mmap_mode="r")
+                for column in self.COLUMNS
+            }
+        return self.columns
+
+    def expense_by_category(self, start_date=None, end_date=None):
+        """
+        Return dict(category: <total_expense>) and total, optionally in a date range
+        """
+
+        import numpy
+
+        columns = self.load()
+        mask = columns["type"] == self.TYPES.index("expense")
+        if start_date is not None:
+            mask &= columns["epoch"] >= to_epoch(start_date)
+            mask &= columns["epoch"] <= to_epoch(end_date)
+
+        # Summed as int64, bincount weights are summed as float64 and lose cents past
+        # 2**53
+        categories = self.meta["categories"]
+        totals = numpy.zeros(len(categories), dtype=numpy.int64)
+        numpy.add.at(totals, columns["category"][mask], columns["amount"][mask])
+
+        stats = {category: int(total) for category, total in zip(categories, totals)}
+        return stats, sum(stats.values())
+
+
+def to_epoch(date_time):
+    """
+    Return the seconds since 1970-01-01 of a date_time string (0 if it is invalid)
+    """
+
+    try:
+        # Same as calendar.timegm, without importing calendar at startup
+        return (
+            datetime.datetime.fromisoformat(date_time) - datetime.datetime(1970, 1, 1)
+        ) // datetime.timedelta(seconds=1)
+    except ValueError:
+        return 0
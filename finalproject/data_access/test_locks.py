@@ -0,0 +1,71 @@
+from data_access import locks, repositories
+
+
+def open_locked(storage):
+    config = dict(repositories.DEFAULT_CONFIG, storage=storage, locking=True)
+    return repositories.open_transaction_repository(config)
+
+
+def test_version_is_shared(database):
+    first, second = locks.LedgerLock(), locks.LedgerLock()
+    version = first.version()
+
+    assert second.bump() == version + 1
+    assert first.version() == version + 1
+
+
+def test_lock_is_reentrant(database):
+    lock = locks.LedgerLock()
+    with lock.shared():
+        with lock.exclusive():
+            assert lock.mode == locks.EXCLUSIVE
+        assert lock.mode == locks.SHARED
+    assert lock.mode is None
+
+
+def test_repositories_see_each_other_writes(database, make_transaction):
+    # The partitioned storage keeps its manifest in memory, reloaded when the version
+    # changed
+    first, second = open_locked("partitioned"), open_locked("partitioned")
+    first.import_transactions([make_transaction(id) for id in range(1, 4)])
+
+    assert second.last_id() == f"{3:09d}"
+    assert second.read(f"{2:09d}") == make_transaction(2)
+
+    second.create(make_transaction(4, date_time="2026-02-01 12:00:00"))
+    second.delete(f"{1:09d}")
+    assert first.last_id() == f"{4:09d}"
+    assert [t["id"] for t in first.readall()] == [f"{id:09d}" for id in [2, 3, 4]]
+
+
+def test_only_writes_bump_the_version(database, make_transaction):
+    repository = open_locked("csv")
+    version = repository.lock.version()
+
+    repository.create(make_transaction(1))
+    repository.update(f"{1:09d}", amount="5")
+    assert repository.lock.version() == version + 2
+
+    list(repository.readall())
+    repository.read(f"{1:09d}")
+    assert repository.lock.version() == version + 2
+
+
+def test_fixed_width_compacts_under_the_ledger_lock(
+    database, make_transaction, monkeypatch
+):
+    monkeypatch.setattr(
+        repositories.FixedWidthTransactionRepository, "COMPACTION_MIN_TOMBSTONES", 3
+    )
+    repository = open_locked("fixed")
+    other = open_locked("fixed")
+    repository.import_transactions([make_transaction(id) for id in range(1, 11)])
+
+    for id in [1, 2, 3]:
+        repository.delete(f"{id:09d}")
+
+    # Compacted in the delete, not in a thread another process could append during
+    assert repository.repository._compaction is None
+    assert len(list(other.readall())) == 7
+    other.create(make_transaction(11))
+    assert [t["id"] for t in repository.readall()][-1] == f"{11:09d}"
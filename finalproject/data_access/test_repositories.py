@@ -0,0 +1,276 @@
+import json
+import os
+
+import pytest
+
+from data_access import repositories
+
+
+# Id index of transactions.csv
+
+
+def test_id_index_after_append(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 6)])
+    repository.create(make_transaction(6, note="last"))
+
+    assert repository.read(f"{6:09d}")["note"] == "last"
+    assert repository.read(f"{3:09d}")["id"] == f"{3:09d}"
+    assert repository.read(f"{7:09d}") is None
+    assert repository.index.lookup(f"{6:09d}")[0] == 5
+
+
+def test_id_index_after_update(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 6)])
+
+    # The row grows, the rows after it move
+    repository.update(f"{2:09d}", note="a much longer note than before")
+    assert repository.read(f"{2:09d}")["note"] == "a much longer note than before"
+    for id in [1, 3, 4, 5]:
+        assert repository.read(f"{id:09d}") == make_transaction(id)
+
+    # Appends after an update are found too
+    repository.create(make_transaction(6))
+    assert repository.read(f"{6:09d}") == make_transaction(6)
+
+
+def test_id_index_after_delete(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 6)])
+
+    repository.delete(f"{3:09d}")
+    assert repository.read(f"{3:09d}") is None
+    for id in [1, 2, 4, 5]:
+        assert repository.read(f"{id:09d}") == make_transaction(id)
+    assert [t["id"] for t in repository.readall()] == [
+        f"{id:09d}" for id in [1, 2, 4, 5]
+    ]
+
+
+def test_id_index_rebuilt_when_stale(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 4)])
+
+    # Edited by hand, without a line break at the end
+    with open(repository.file_path, "ab") as file:
+        file.write(b"000000004,income,5,2026-01-02 12:00:00,food,")
+
+    assert repository.read(f"{4:09d}")["type"] == "income"
+    repository.create(make_transaction(5))
+    assert repository.read(f"{5:09d}") == make_transaction(5)
+
+
+def test_rows_with_line_breaks_are_rejected(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.create(make_transaction(1))
+
+    with pytest.raises(ValueError):
+        repository.import_transactions(
+            [make_transaction(2), make_transaction(3, note="line1\nline2")]
+        )
+    with pytest.raises(ValueError):
+        repository.update(f"{1:09d}", note="line1\r\nline2")
+
+    # Nothing was written, every row is still one line
+    assert list(repository.readall()) == [make_transaction(1)]
+    repository.create(make_transaction(2))
+    assert repository.delete(f"{1:09d}")["amount"] == "100"
+    assert repository.read(f"{2:09d}") == make_transaction(2)
+
+
+def test_reverse_reader_after_rejected_rows(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 4)])
+    with pytest.raises(ValueError):
+        repository.create(make_transaction(4, note='line1\nline2"'))
+
+    # Small blocks, rows are split across them
+    assert list(repository.readall_reverse(block_size=16)) == [
+        make_transaction(id) for id in [3, 2, 1]
+    ]
+
+
+def test_pages_after_rejected_rows(database, make_transaction):
+    repository = repositories.TransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 6)])
+    with pytest.raises(ValueError):
+        repository.create(make_transaction(6, note='line1\nline2"'))
+
+    assert repository.read_page(None, 2) == [make_transaction(1), make_transaction(2)]
+    assert repository.read_page(f"{2:09d}", 2) == [
+        make_transaction(3),
+        make_transaction(4),
+    ]
+    assert repository.read_page(f"{4:09d}", 2) == [make_transaction(5)]
+    assert repository.read_page(f"{5:09d}", 2) == []
+
+
+# SQLite storage
+
+
+def test_sqlite_pages_after_an_unpadded_id(database, make_transaction):
+    repository = repositories.SqliteTransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 6)])
+
+    assert repository.read_page("2", 2) == [make_transaction(3), make_transaction(4)]
+    assert repository.read_page(f"{4:09d}", 2) == [make_transaction(5)]
+
+
+# Fixed-width storage
+
+
+def test_fixed_width_delete_leaves_tombstone(database, make_transaction):
+    repository = repositories.FixedWidthTransactionRepository()
+    repository.import_transactions([make_transaction(id) for id in range(1, 6)])
+    size = os.path.getsize(repository.file_path)
+
+    assert repository.delete(f"{2:09d}")["amount"] == "100"
+    assert repository.delete(f"{2:09d}") is None
+
+    # Only the status byte changed
+    assert os.path.getsize(repository.file_path) == size
+    assert repository.read(f"{2:09d}") is None
+    assert [t["id"] for t in repository.readall()] == [
+        f"{id:09d}" for id in [1, 3, 4, 5]
+    ]
+
+
+def test_fixed_width_compaction(database, make_transaction, monkeypatch):
+    monkeypatch.setattr(
+        repositories.FixedWidthTransactionRepository, "COMPACTION_MIN_TOMBSTONES", 3
+    )
+    repository = repositories.FixedWidthTransactionRepository()
+    repository.background_compaction = False
+    repository.import_transactions([make_transaction(id) for id in range(1, 11)])
+
+    for id in [1, 4, 7]:
+        repository.delete(f"{id:09d}")
+
+    # Compacted by the third delete
+    assert os.path.getsize(repository.file_path) == 7 * repository.RECORD_SIZE
+    assert [t["id"] for t in repository.readall()] == [
+        f"{id:09d}" for id in [2, 3, 5, 6, 8, 9, 10]
+    ]
+    assert repository.read(f"{8:09d}") == make_transaction(8)
+
+    repository.update(f"{9:09d}", amount="5")
+    repository.create(make_transaction(11))
+    assert repository.read(f"{9:09d}")["amount"] == "5"
+    assert repository.read(f"{11:09d}") == make_transaction(11)
+
+
+def test_fixed_width_rejects_long_fields(database, make_transaction):
+    repository = repositories.FixedWidthTransactionRepository()
+    repository.create(make_transaction(1))
+
+    with pytest.raises(ValueError):
+        repository.import_transactions(
+            [make_transaction(2), make_transaction(3, note="x" * 200)]
+        )
+
+    # Nothing of the batch was written
+    assert [t["id"] for t in repository.readall()] == [f"{1:09d}"]
+
+
+def test_fixed_width_migrates_the_csv_history(database, make_transaction):
+    history = [make_transaction(id) for id in range(1, 4)]
+    repositories.TransactionRepository().import_transactions(history)
+    config = dict(repositories.DEFAULT_CONFIG, storage="fixed")
+
+    assert list(repositories.open_ledger(config).readall()) == history
+
+    # Only when transactions.dat is created
+    assert list(repositories.open_ledger(config).readall()) == history
+
+
+# Write-ahead log
+
+
+def open_wal(ledger):
+    return repositories.WalTransactionRepository(
+        ledger, repositories.WriteAheadLog(repositories.wal_path())
+    )
+
+
+def test_wal_checkpoint_applies_pending_writes(database, make_transaction):
+    ledger = repositories.TransactionRepository()
+    repository = open_wal(ledger)
+    repository.import_transactions([make_transaction(id) for id in range(1, 4)])
+    repository.update(f"{2:09d}", amount="7")
+    repository.delete(f"{3:09d}")
+
+    # Pending writes are visible before they reach the ledger
+    assert ledger.read(f"{1:09d}") is None
+    assert repository.read(f"{2:09d}")["amount"] == "7"
+    assert repository.read(f"{3:09d}") is None
+    assert repository.last_id() == f"{3:09d}"
+
+    # Reads of the ledger checkpoint first
+    assert [t["amount"] for t in repository.readall()] == ["100", "7"]
+    assert os.path.getsize(repositories.wal_path()) == 0
+    repository.close()
+
+
+def test_wal_replay_is_idempotent(database, make_transaction):
+    repository = open_wal(repositories.TransactionRepository())
+    repository.import_transactions([make_transaction(id) for id in range(1, 4)])
+    repository.update(f"{1:09d}", note="updated")
+    repository.delete(f"{2:09d}")
+
+    # Crash after the ledger was written, before the log was emptied
+    repository.wal.truncate = lambda: None
+    repository.checkpoint()
+    repository.wal.file.close()
+
+    repositories.recover_wal(repositories.load_config())
+
+    ledger = repositories.TransactionRepository()
+    assert list(ledger.readall()) == [
+        make_transaction(1, note="updated"),
+        make_transaction(3),
+    ]
+    assert os.path.getsize(repositories.wal_path()) == 0
+
+
+def test_wal_recovers_after_crash(database, make_transaction):
+    repository = open_wal(repositories.TransactionRepository())
+    repository.import_transactions([make_transaction(id) for id in range(1, 4)])
+    repository.update(f"{3:09d}", amount="42")
+
+    # Crash before any checkpoint, then a torn last line
+    repository.wal.file.close()
+    with open(repositories.wal_path(), "ab") as file:
+        file.write(b'{"op": "create", "transac')
+
+    repositories.recover_wal(repositories.load_config())
+
+    ledger = repositories.TransactionRepository()
+    assert list(ledger.readall()) == [
+        make_transaction(1),
+        make_transaction(2),
+        make_transaction(3, amount="42"),
+    ]
+    assert os.path.getsize(repositories.wal_path()) == 0
+
+
+def test_wal_rejects_writes_the_ledger_cannot_store(database, make_transaction):
+    repository = open_wal(repositories.FixedWidthTransactionRepository())
+    repository.create(make_transaction(1))
+
+    with pytest.raises(ValueError):
+        repository.create(make_transaction(2, note="x" * 200))
+    with pytest.raises(ValueError):
+        repository.update(f"{1:09d}", note="x" * 200)
+
+    # Only the valid write was logged, the checkpoint applies it
+    with open(repositories.wal_path(), "rb") as file:
+        assert [json.loads(line)["op"] for line in file] == ["create"]
+    repository.close()
+    assert list(repository.repository.readall()) == [make_transaction(1)]
+
+
+def test_wal_cannot_be_used_with_locking(database):
+    config = dict(repositories.DEFAULT_CONFIG, wal=True, locking=True)
+    with pytest.raises(ValueError):
+        repositories.open_transaction_repository(config)
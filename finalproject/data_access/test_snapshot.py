@@ -0,0 +1,18 @@
+from data_access import snapshot
+
+
+def test_expense_by_category_sums_exact_integers(database, make_transaction):
+    # Past 2**53 a float64 sum would drop the 1
+    transactions = [
+        make_transaction(1, amount=str(2**60)),
+        make_transaction(2, amount="1"),
+        make_transaction(3, amount="5", category="rent"),
+        make_transaction(4, amount="7", type="income"),
+    ]
+    columnar = snapshot.ColumnarSnapshot()
+    columnar.refresh(transactions, [0, 0])
+
+    assert columnar.expense_by_category() == (
+        {"food": 2**60 + 1, "rent": 5},
+        2**60 + 6,
+    )
@@ -1,42 +1,119 @@
+import sys
+import time
+
 from business_logic import entities, services, validation
-from data_access import repositories
+from data_access import repositories, snapshot
 from presentation import controller, ui_components
 
 
 def main():
+    args = parse_arguments(sys.argv[1:])
+
+    start = time.perf_counter()
+    backend_controller = load_controller()
+
+    # Run (the modules of the other modes are imported when they are used)
+    if args is None:
+        app = ui_components
+        app.run_application(backend_controller)
+    elif args.script is not None:
+        from presentation import batch
+
+        if args.script == "-":
+            failed = batch.run_script(backend_controller, sys.stdin, sys.stdout, start)
+        else:
+            with open(args.script, "r") as file:
+                failed = batch.run_script(backend_controller, file, sys.stdout, start)
+        sys.exit(1 if failed else 0)
+    elif args.command == "serve":
+        from presentation import server
+
+        server.serve(backend_controller, args.host, args.port)
+    else:
+        app = ui_components
+        app.run_application(backend_controller)
+
+
+def parse_arguments(arguments):
+    """
+    Return the command line options, None without arguments (the prompt): argparse is
+    only imported when there is something to parse
+    """
+
+    if not arguments:
+        return None
+
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="fincli")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["serve"],
+        help="serve: HTTP/JSON API on localhost instead of the prompt",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--script",
+        metavar="FILE",
+        help="run the commands of FILE (- for stdin) and print JSON lines",
+    )
+    return parser.parse_args(arguments)
+
+
+def load_controller():
     # Check for the existence of the database, if not, initialize it
     repositories.initialize_database()
 
-    # Repositories
-    transaction_repo = repositories.TransactionRepository()
+    # Repositories (transaction storage is chosen in database/config.json)
+    config = repositories.load_config()
+    transaction_repo = repositories.open_transaction_repository(config)
     category_repo = repositories.CategoryRepository()
+    checkpoint_repo = repositories.CheckpointRepository()
+    rollup_repo = repositories.RollupRepository()
 
-    # Entities
-    user = entities.User(transaction_repo.readall())
+    # Entities. The user's totals and the rollups are loaded by the first command
+    # (Controller.refresh), so the prompt does not wait for them
     categories = entities.Categories(category_repo.readall())
 
     # Validation
-    transaction_validation = validation.TransactionValidation(category_repo.readall())
+    transaction_validation = validation.TransactionValidation(categories)
 
     # Services
-    user_service = services.UserService(user)
-    transaction_service = services.TransactionService(transaction_repo)
+    user_service = services.UserService(None, checkpoint_repo)
+    rollup_service = services.RollupService(None, rollup_repo)
+    transaction_service = services.TransactionService(
+        transaction_repo,
+        config["fast_reader"],
+        config["cache"],
+        config["cache_max_rows"],
+    )
+
+    # The write-ahead log changes the ledger when it checkpoints, keep the totals
+    # checkpoint, the rollups and the cached ledger tagged with the new ledger
+    if hasattr(transaction_repo, "on_checkpoint"):
+        transaction_repo.on_checkpoint.append(
+            lambda: user_service.save_checkpoint(transaction_repo)
+        )
+        transaction_repo.on_checkpoint.append(
+            lambda: rollup_service.save(transaction_repo)
+        )
+        transaction_repo.on_checkpoint.append(transaction_service.sync_cache)
 
     # Controller
-    backend_controller = controller.Controller(
+    return controller.Controller(
         transaction_repo,
         category_repo,
         categories,
-        user,
+        None,
         transaction_validation,
         user_service,
         transaction_service,
+        snapshot.ColumnarSnapshot(),
+        rollup_service,
     )
 
-    # Run
-    app = ui_components
-    app.run_application(backend_controller)
-
 
 if __name__ == "__main__":
     main()
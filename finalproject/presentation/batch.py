@@ -0,0 +1,102 @@
+import json
+import time
+
+from presentation import ui_components
+
+
+class JsonOutput:
+    """
+    Collect the results of a command as JSON-serializable records instead of drawing
+    tables (same methods as ui_components.TerminalOutput)
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def transactions(self, title, transactions, caption=None):
+        self.records.append(
+            {"title": title, "transactions": list(transactions), "caption": caption}
+        )
+
+    def stream_transactions(self, title, transactions, caption):
+        transactions = list(transactions)
+        self.records.append(
+            {
+                "title": title,
+                "transactions": transactions,
+                "caption": caption(len(transactions)),
+            }
+        )
+
+    def table(self, title, columns, rows, caption=None):
+        keys = [key(header) for header, _ in columns]
+        self.records.append(
+            {
+                "title": title,
+                "rows": [dict(zip(keys, row)) for row in rows],
+                "caption": caption,
+            }
+        )
+
+    def fields(self, fields):
+        self.records.append({key(name): value for name, value in fields.items()})
+
+    def items(self, items):
+        self.records.append({"items": list(items)})
+
+    def message(self, text):
+        self.records.append({"message": text})
+
+
+def key(header):
+    # "Date Time" -> "date_time", the unnamed histogram bar column -> "bar"
+    return header.lower().replace(" ", "_") or "bar"
+
+
+def run_script(controller, lines, file, start=None):
+    """
+    Run the commands in lines against one controller, without prompt or rendering.
+    Every command writes one JSON line to file: its line number, the command, ok, its
+    output records or its error and its time. A last line sums up the run with its
+    wall time since start (time.perf_counter(), e.g. before the controller was loaded;
+    now by default). Empty lines and lines starting with # are skipped, exit or quit
+    stops the script. Return the number of failed commands
+    """
+
+    if start is None:
+        start = time.perf_counter()
+    commands = 0
+    failed = 0
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        command, subcommand, arguments = ui_components.split_command(line)
+        if command in ["exit", "quit"]:
+            break
+
+        commands += 1
+        record = {"line": number, "command": line}
+        output = JsonOutput()
+        command_start = time.perf_counter()
+        try:
+            # Pick up the writes of other processes sharing the database
+            controller.refresh()
+            ui_components.run_command(
+                controller, command, subcommand, arguments, output
+            )
+            record.update(ok=True, output=output.records)
+        except Exception as e:
+            failed += 1
+            record.update(ok=False, error=str(e))
+        record["seconds"] = round(time.perf_counter() - command_start, 6)
+        file.write(json.dumps(record) + "\n")
+
+    summary = {
+        "commands": commands,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 6),
+    }
+    file.write(json.dumps({"summary": summary}) + "\n")
+    return failed
@@ -1,3 +1,15 @@
+import contextlib
+import csv
+import os
+import time
+
+from business_logic import entities, queries, services
+from data_access import exporters
+
+# Columns of a csv file to import
+IMPORT_FIELDS = ["type", "amount", "date_time", "category", "note"]
+
+
 class Controller:
     def __init__(
         self,
@@ -8,6 +20,8 @@ class Controller:
         transaction_validation,
         user_service,
         transaction_service,
+        snapshot=None,
+        rollup_service=None,
     ):
         # Data access
         self.transaction_manager = transaction_manager
@@ -24,6 +38,59 @@ class Controller:
         self.user_service = user_service
         self.transaction_service = transaction_service
 
+        # Columnar snapshot for statistics (optional)
+        self.snapshot = snapshot
+
+        # Totals per day and month for statistics (optional)
+        self.rollup_service = rollup_service
+
+        # Ledger version the totals were computed at (ledgers shared between processes)
+        self.lock = getattr(transaction_manager, "lock", None)
+        self.version = self.ledger_version()
+
+    def ledger_version(self):
+        return self.lock.version() if self.lock is not None else None
+
+    def refresh(self):
+        """
+        Load the user's totals and the rollups if they are not loaded yet (user is None,
+        loading is left to the first command), reload them if another process changed
+        the ledger since they were computed
+        """
+
+        if self.user is not None and self.ledger_version() == self.version:
+            return
+
+        lock = self.lock.shared() if self.lock is not None else contextlib.nullcontext()
+        with lock:
+            self.version = self.ledger_version()
+            self.user = services.load_user(
+                self.transaction_manager, self.user_service.checkpoint_repository
+            )
+            self.user_service.user = self.user
+            if self.rollup_service is not None:
+                self.rollup_service.rollups = services.load_rollups(
+                    self.transaction_manager, self.rollup_service.rollup_repository
+                )
+            self.transaction_service.expire_cache()
+
+    @contextlib.contextmanager
+    def writing(self):
+        """
+        Hold the ledger exclusively while a write and the update of the totals run, on
+        totals refreshed with the writes of other processes
+        """
+
+        if self.lock is None:
+            self.refresh()
+            yield
+            return
+
+        with self.lock.exclusive():
+            self.refresh()
+            yield
+            self.version = self.lock.version()
+
     def get_income(self):
         return self.user.income
 
@@ -34,31 +101,200 @@ class Controller:
         return self.user.balance
 
     def save_transaction(self, **kwargs):
-        self.transaction_validate(**kwargs)
-        self.transaction_service.create(self.user, **kwargs)
-        self.user_service.apply_transaction(kwargs["type"], int(kwargs["amount"]))
+        with self.writing():
+            self.transaction_validate(**kwargs)
+            self.canonicalize(kwargs)
+            self.transaction_service.create(self.user, **kwargs)
+            self.user_service.add_transaction(kwargs["type"], int(kwargs["amount"]))
+            self.user_service.save_checkpoint(self.transaction_manager)
+
+            if self.rollup_service is not None:
+                self.rollup_service.add_transaction(
+                    kwargs["type"],
+                    int(kwargs["amount"]),
+                    kwargs["date_time"],
+                    kwargs["category"],
+                )
+                self.rollup_service.save(self.transaction_manager)
 
     def update_transaction(self, id, **kwargs):
-        self.transaction_validate(**kwargs)
-        if (
-            transaction_info := self.transaction_service.update(id, **kwargs)
-        ) is not None:
-            self.user_service.apply_transaction(
-                transaction_info["type_old"],
-                int(transaction_info["amount_old"]),
-                transaction_info["type_new"],
-                int(transaction_info["amount_new"]),
-            )
+        with self.writing():
+            self.transaction_validate(**kwargs)
+            self.canonicalize(kwargs)
+            if (
+                transaction_info := self.transaction_service.update(id, **kwargs)
+            ) is not None:
+                self.user_service.apply_transaction(
+                    transaction_info["type_old"],
+                    int(transaction_info["amount_old"]),
+                    transaction_info["type_new"],
+                    int(transaction_info["amount_new"]),
+                )
+                self.user_service.save_checkpoint(self.transaction_manager)
+
+                if self.rollup_service is not None:
+                    self.rollup_service.revert_transaction(
+                        transaction_info["type_old"],
+                        int(transaction_info["amount_old"]),
+                        transaction_info["date_time_old"],
+                        transaction_info["category_old"],
+                    )
+                    self.rollup_service.add_transaction(
+                        transaction_info["type_new"],
+                        int(transaction_info["amount_new"]),
+                        transaction_info["date_time_new"],
+                        transaction_info["category_new"],
+                    )
+                    self.rollup_service.save(self.transaction_manager)
 
     def delete_transaction(self, id):
-        if (transaction_info := self.transaction_service.delete(id)) is not None:
-            self.user_service.revert_transaction(
-                transaction_info["type"], int(transaction_info["amount"])
+        with self.writing():
+            if (transaction_info := self.transaction_service.delete(id)) is not None:
+                self.user_service.revert_transaction(
+                    transaction_info["type"], int(transaction_info["amount"])
+                )
+                self.user_service.save_checkpoint(self.transaction_manager)
+
+                if self.rollup_service is not None:
+                    self.rollup_service.revert_transaction(
+                        transaction_info["type"],
+                        int(transaction_info["amount"]),
+                        transaction_info["date_time"],
+                        transaction_info["category"],
+                    )
+                    self.rollup_service.save(self.transaction_manager)
+
+    def save_transactions(self, transactions):
+        """
+        Validate and save many transactions (dicts of type, amount, date_time, category,
+        note) with one write, the user's totals and the rollups are saved once. Invalid
+        transactions are skipped, return dict(<index>: [<error>, ...]) of them
+        """
+
+        with self.writing():
+            errors = self.transaction_validation.validate_many(transactions)
+            valid = [
+                self.canonicalize(dict(transaction))
+                for index, transaction in enumerate(transactions)
+                if index not in errors
+            ]
+            if not valid:
+                return errors
+
+            # The totals and the rollups only change once the write succeeded
+            self.transaction_service.create_many(valid)
+
+            totals = {"income": 0, "expense": 0}
+            for transaction in valid:
+                totals[transaction["type"]] += int(transaction["amount"])
+                if self.rollup_service is not None:
+                    self.rollup_service.add_transaction(
+                        transaction["type"],
+                        int(transaction["amount"]),
+                        transaction["date_time"],
+                        transaction["category"],
+                    )
+            self.user_service.add_totals(
+                len(valid), totals["income"], totals["expense"]
             )
+            self.user_service.save_checkpoint(self.transaction_manager)
+            if self.rollup_service is not None:
+                self.rollup_service.save(self.transaction_manager)
+            return errors
+
+    def import_transactions(self, path, batch_size=10000):
+        """
+        Import the transactions of a csv file (columns: type, amount, date_time, category,
+        note), validated and written in batches. Invalid rows are written with their row
+        number and errors to <path>.rejects.csv. Return (imported, rejected, reject_path)
+        """
+
+        with self.writing():
+            imported = 0
+            rejected = 0
+            reject_path = os.path.splitext(path)[0] + ".rejects.csv"
+
+            with open(path, "r", newline="") as src, open(
+                reject_path, "w", newline=""
+            ) as rejects:
+                reader = csv.DictReader(src)
+                pen = csv.DictWriter(
+                    rejects,
+                    fieldnames=["row", "errors", *IMPORT_FIELDS],
+                    extrasaction="ignore",
+                )
+                pen.writeheader()
+
+                while True:
+                    # Read a batch
+                    batch = []
+                    rows = []
+                    for transaction in reader:
+                        batch.append(
+                            {
+                                field: (transaction.get(field) or "").strip()
+                                for field in IMPORT_FIELDS
+                            }
+                        )
+                        batch[-1]["type"] = batch[-1]["type"].lower()
+                        batch[-1]["category"] = batch[-1]["category"].lower()
+                        rows.append(reader.line_num)
+                        if len(batch) == batch_size:
+                            break
+                    if not batch:
+                        break
+
+                    # Validate and save the valid rows in one write
+                    errors = self.save_transactions(batch)
+                    for index, messages in errors.items():
+                        pen.writerow(
+                            {
+                                "row": rows[index],
+                                "errors": "; ".join(messages),
+                                **batch[index],
+                            }
+                        )
+                    imported += len(batch) - len(errors)
+                    rejected += len(errors)
+
+            if rejected == 0:
+                os.remove(reject_path)
+                reject_path = None
+
+            return imported, rejected, reject_path
+
+    def export_transactions(
+        self, path, format="csv", start_date=None, end_date=None, category=None
+    ):
+        """
+        Stream the transactions (optionally in a date range and/or of a category) to a
+        file in csv, jsonl or parquet format. Return (rows, seconds)
+        """
+
+        if format not in exporters.EXPORTERS:
+            raise ValueError(f"Unsupported format: {format}")
+
+        transactions = self.transaction_service.scan(start_date, end_date, category)
+
+        start = time.perf_counter()
+        rows = exporters.EXPORTERS[format](transactions, path)
+        return rows, time.perf_counter() - start
 
     def get_all_transactions(self):
         return self.transaction_service.readall()
 
+    def get_recent_transactions(self, limit):
+        return self.transaction_service.recent(limit)
+
+    def get_transaction_page(self, after=None, page_size=50):
+        return self.transaction_service.page(after, page_size)
+
+    def get_sorted_transactions(self, field, limit, descending=False):
+        return self.transaction_service.top(field, limit, descending)
+
+    def get_transaction(self, id):
+        return self.transaction_service.read(id)
+
     def transaction_validate(self, **kwargs):
         """
         Remember: all data are in string format when received from UI
@@ -79,11 +315,24 @@ class Controller:
                     if not self.transaction_validation.date_time_validate(value):
                         raise ValueError(f"Invalid date and time: {value}")
                 case "note":
-                    # Note can be any string, no validation needed
-                    pass
+                    # Any text on one line
+                    if not self.transaction_validation.note_validate(value):
+                        raise ValueError("Invalid note: line breaks are not allowed")
                 case _:
                     raise ValueError(f"Unknown field: {field}")
 
+    def canonicalize(self, transaction):
+        """
+        Rewrite the validated date_time of a transaction (dict of fields) in the format
+        of the ledger, return the transaction
+        """
+
+        if "date_time" in transaction:
+            transaction["date_time"] = self.transaction_validation.date_time_canonical(
+                transaction["date_time"]
+            )
+        return transaction
+
     def filter_by(self, fieldname, *args):
         """
         args usage depends on fieldname:
@@ -105,9 +354,19 @@ class Controller:
             case _:
                 raise ValueError(f"Not support fieldname: {fieldname}")
 
-    def stats_expense_by_category(self):
+    def filter_transactions(self, **predicates):
+        """
+        Filter on many fields at once, predicates as in queries.Query (category, type,
+        start_date, end_date, min_amount, max_amount). Return a queries.Plan: its
+        description and the stream of matching transactions
+        """
+
+        return self.transaction_service.query(queries.Query(**predicates))
+
+    def stats_expense_by_category(self, start_date=None, end_date=None):
         """
-        Return dict(category: <total_expense>) and total(for percentage calculation)
+        Return dict(category: <total_expense>) and total(for percentage calculation),
+        optionally only for the transactions in a date range
         """
 
         stats = {}
@@ -115,14 +374,124 @@ class Controller:
         for category in self.category.categories:
             stats[category] = 0
 
-        for transaction in self.transaction_service.filter_by_type("expense"):
-            total += int(transaction["amount"])
-            stats[transaction["category"]] += int(transaction["amount"])
+        # Aggregate the columnar snapshot if it is up to date with the ledger
+        if self.snapshot is not None and self.snapshot.is_fresh(
+            self.transaction_service.fingerprint()
+        ):
+            snapshot_stats, total = self.snapshot.expense_by_category(
+                start_date, end_date
+            )
+            stats.update(snapshot_stats)
+            return stats, total
+
+        # Whole days and months from the rollups, the partial days from the ledger
+        if self.rollup_service is not None:
+            totals, raw_ranges = self.rollup_service.totals(
+                "expense", start_date, end_date
+            )
+            stats.update(totals)
+            for start, end in raw_ranges:
+                for transaction in self.transaction_service.filter_by_date_range(
+                    start, end
+                ):
+                    if transaction["type"] == "expense":
+                        category = transaction["category"]
+                        stats[category] = stats.get(category, 0) + int(
+                            transaction["amount"]
+                        )
+            return stats, sum(stats.values())
+
+        if start_date is None and self.transaction_service.fast_reader:
+            for batch in self.transaction_service.readall_records():
+                for record in batch:
+                    if record.type == "expense":
+                        total += record.amount
+                        stats[record.category] = stats.get(record.category, 0) + (
+                            record.amount
+                        )
+            return stats, total
+
+        if start_date is None:
+            transactions = self.transaction_service.filter_by_type("expense")
+        else:
+            transactions = (
+                transaction
+                for transaction in self.transaction_service.filter_by_date_range(
+                    start_date, end_date
+                )
+                if transaction["type"] == "expense"
+            )
+
+        for transaction in transactions:
+            amount = int(transaction["amount"])
+            total += amount
+            category = transaction["category"]
+            stats[category] = stats.get(category, 0) + amount
 
         return stats, total
 
-    # Income by category not promised feature :))
-    # Give me money first (-_-)
+    def statistics(self, start_date=None, end_date=None):
+        """
+        Return a StatisticsAggregator with every breakdown (by category, monthly, daily,
+        category trend), optionally only for the transactions in a date range. It is fed
+        by the daily rollups plus the partial days at both ends of the range, or by a
+        single pass over the ledger
+        """
+
+        aggregator = services.StatisticsAggregator()
+
+        if self.rollup_service is not None:
+            entries, raw_ranges = self.rollup_service.daily_totals(start_date, end_date)
+            for day, type, category, amount, count in entries:
+                aggregator.add(type, amount, day, category, count)
+            for start, end in raw_ranges:
+                aggregator.add_transactions(
+                    self.transaction_service.filter_by_date_range(start, end)
+                )
+        elif start_date is None:
+            aggregator.add_transactions(self.transaction_service.readall())
+        else:
+            aggregator.add_transactions(
+                self.transaction_service.filter_by_date_range(start_date, end_date)
+            )
+
+        # Every category is shown, even without transactions
+        for category in self.category.categories:
+            for by_category in aggregator.by_category.values():
+                by_category.setdefault(category, 0)
+
+        return aggregator
+
+    def amount_distribution(self, category=None, type="expense"):
+        """
+        Return the AmountSketch of the amounts of a type, in a category or in all of them.
+        Kept up to date in the rollups, else built from a pass over the ledger
+        """
+
+        if self.rollup_service is not None:
+            return self.rollup_service.sketch(type, category)
+
+        sketch = entities.AmountSketch()
+        if category is None:
+            transactions = self.transaction_service.filter_by_type(type)
+        else:
+            transactions = self.transaction_service.filter_by_category(category)
+        for transaction in transactions:
+            if transaction["type"] == type:
+                sketch.add(int(transaction["amount"]))
+        return sketch
+
+    def refresh_snapshot(self):
+        """
+        Rebuild the columnar snapshot from the ledger, return the number of rows
+        """
+
+        if self.snapshot is None:
+            raise ValueError("Snapshot is not enabled")
+
+        return self.snapshot.refresh(
+            self.transaction_service.readall(), self.transaction_service.fingerprint()
+        )
 
     def get_categories(self):
         return list(self.category.categories)
@@ -0,0 +1,276 @@
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import urllib.parse
+
+from presentation import ui_components
+
+# Fields of a transaction posted to /transactions
+TRANSACTION_FIELDS = ["type", "amount", "date_time", "category", "note"]
+
+STATUS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class WriteBatcher:
+    """
+    Queue the transactions posted by concurrent requests and save them with one
+    Controller.save_transactions call per batch: while a batch is written, the next
+    requests wait in the queue and form the next batch
+    """
+
+    def __init__(self, server, max_batch=10000):
+        self.server = server
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+
+    async def save(self, transactions):
+        """
+        Return dict(<index>: [<error>, ...]) of the invalid transactions
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((transactions, future))
+        return await future
+
+    async def run(self):
+        while True:
+            requests = [await self.queue.get()]
+            size = len(requests[0][0])
+            while not self.queue.empty() and size < self.max_batch:
+                requests.append(self.queue.get_nowait())
+                size += len(requests[-1][0])
+
+            batch = list(
+                itertools.chain.from_iterable(
+                    transactions for transactions, _ in requests
+                )
+            )
+            try:
+                errors = await self.server.call(
+                    self.server.controller.save_transactions, batch
+                )
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            # Split the errors back to the requests
+            offset = 0
+            for transactions, future in requests:
+                future.set_result(
+                    {
+                        index - offset: errors[index]
+                        for index in range(offset, offset + len(transactions))
+                        if index in errors
+                    }
+                )
+                offset += len(transactions)
+
+
+class Server:
+    """
+    HTTP/JSON API over the Controller, on an asyncio server (HTTP/1.1, keep-alive)
+
+    GET  /balance                                   income, expense and balance
+    GET  /transactions?field=<f>&args=<a>[&args=<b>][&limit=<n>]
+                                                    Controller.filter_by
+    POST /transactions                              a transaction or a list of them
+    GET  /stats/expense-by-category[?start_date=<d>&end_date=<d>]
+
+    The Controller is not thread safe, it is only called from one worker thread so
+    the event loop keeps parsing requests while it works. The ledger stays resident
+    (cached) between requests
+    """
+
+    def __init__(self, controller, max_batch=10000):
+        self.controller = controller
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.batcher = WriteBatcher(self, max_batch)
+
+    async def call(self, function, *args):
+        def run():
+            # Pick up the writes of other processes sharing the database
+            self.controller.refresh()
+            return function(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        # Load the ledger before the first request
+        await self.call(self.controller.transaction_service.resident)
+
+        writer = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer.cancel()
+            self.executor.shutdown()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                try:
+                    method, target, headers = parse_head(head)
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(f"Invalid Content-Length: {length}")
+                except ValueError as e:
+                    # The end of the request is unknown, so is the start of the next one
+                    writer.write(response(400, {"error": str(e)}))
+                    await writer.drain()
+                    break
+                try:
+                    body = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                try:
+                    status, data = await self.route(method, target, body)
+                except HTTPError as e:
+                    status, data = e.status, {"error": str(e)}
+                except ValueError as e:
+                    status, data = 400, {"error": str(e)}
+                except Exception as e:
+                    status, data = 500, {"error": str(e)}
+
+                writer.write(response(status, data))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        finally:
+            writer.close()
+
+    async def route(self, method, target, body):
+        url = urllib.parse.urlsplit(target)
+        params = urllib.parse.parse_qs(url.query)
+
+        match url.path:
+            case "/balance":
+                expect(method, "GET")
+                return 200, await self.call(self.balance)
+
+            case "/transactions" if method == "POST":
+                return await self.save(json.loads(body or b"null"))
+
+            case "/transactions":
+                expect(method, "GET")
+                if "field" not in params:
+                    raise ValueError("Missing parameter: field")
+                limit = int(params["limit"][0]) if "limit" in params else None
+                transactions = await self.call(
+                    self.filter_by, params["field"][0], params.get("args", []), limit
+                )
+                return 200, {"transactions": transactions}
+
+            case "/stats/expense-by-category":
+                expect(method, "GET")
+                start_date = params.get("start_date", [None])[0]
+                end_date = params.get("end_date", [None])[0]
+                if (start_date is None) != (end_date is None):
+                    raise ValueError("start_date and end_date are given together")
+                if start_date is not None:
+                    # A plain end date includes the whole day, as in the CLI
+                    start_date, end_date = ui_components.date_range(
+                        [start_date, end_date]
+                    )
+                stats, total = await self.call(
+                    self.controller.stats_expense_by_category, start_date, end_date
+                )
+                return 200, {"stats": stats, "total": total}
+
+            case _:
+                raise HTTPError(404, f"Unknown path: {url.path}")
+
+    def balance(self):
+        return {
+            "income": self.controller.get_income(),
+            "expense": self.controller.get_expense(),
+            "balance": self.controller.get_balance(),
+        }
+
+    def filter_by(self, field, args, limit):
+        return list(
+            itertools.islice(self.controller.filter_by(field, *args), limit)
+        )
+
+    async def save(self, data):
+        many = isinstance(data, list)
+        transactions = data if many else [data]
+        if not all(isinstance(transaction, dict) for transaction in transactions):
+            raise ValueError("Expected a transaction object or a list of them")
+
+        transactions = [
+            {field: str(transaction.get(field) or "") for field in TRANSACTION_FIELDS}
+            for transaction in transactions
+        ]
+        for transaction in transactions:
+            transaction["type"] = transaction["type"].lower()
+            transaction["category"] = transaction["category"].lower()
+
+        errors = await self.batcher.save(transactions)
+        if not many:
+            if errors:
+                raise ValueError("; ".join(errors[0]))
+            return 201, {"created": 1}
+        return 201, {"created": len(transactions) - len(errors), "errors": errors}
+
+
+def parse_head(head):
+    """
+    Return (method, target, headers) of the request line and headers of a request,
+    header names in lowercase
+    """
+
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, headers
+
+
+def expect(method, allowed):
+    if method != allowed:
+        raise HTTPError(405, f"Method not allowed: {method}")
+
+
+def response(status, data):
+    body = json.dumps(data).encode()
+    head = (
+        f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    )
+    return head.encode() + body
+
+
+def serve(controller, host="127.0.0.1", port=8765):
+    try:
+        asyncio.run(Server(controller).serve(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+import main
+
+
+def transaction(**fields):
+    return {
+        "type": "expense",
+        "amount": "100",
+        "date_time": "2026-01-15 12:00:00",
+        "category": "food",
+        "note": "",
+        **fields,
+    }
+
+
+def totals(controller):
+    controller.refresh()
+    stats = controller.statistics()
+    return (
+        controller.get_income(),
+        controller.get_expense(),
+        controller.stats_expense_by_category(),
+        stats.monthly,
+        stats.daily,
+        stats.category_trend,
+    )
+
+
+def test_rollups_unchanged_by_a_failed_write(database, monkeypatch):
+    controller = main.load_controller()
+    controller.save_transactions([transaction(), transaction(type="income")])
+
+    def fail(transactions):
+        raise OSError("disk full")
+
+    repository = controller.transaction_service.data_access
+    with monkeypatch.context() as patch:
+        patch.setattr(repository, "import_transactions", fail)
+        with pytest.raises(OSError):
+            controller.save_transactions([transaction(amount="999")])
+
+    # The next write saves the totals and rollups
+    controller.save_transactions([transaction(date_time="2026-02-01 08:00:00")])
+
+    assert (controller.get_income(), controller.get_expense()) == (100, 200)
+
+    # Saved totals and rollups match the ones rebuilt from the ledger
+    saved = totals(main.load_controller())
+    for name in ["checkpoint.json", "rollups.json"]:
+        os.remove(database / name)
+    assert saved == totals(main.load_controller()) == totals(controller)
+
+
+def test_dates_are_stored_in_the_ledger_format(database):
+    controller = main.load_controller()
+    controller.refresh()
+    controller.save_transaction(**transaction(date_time="2026-1-5 1:2:3"))
+    controller.save_transactions([transaction(date_time="2026-1-6 4:5:6")])
+    controller.update_transaction(f"{1:09d}", date_time="2026-2-7 7:8:9")
+
+    assert [t["date_time"] for t in controller.get_all_transactions()] == [
+        "2026-02-07 07:08:09",
+        "2026-01-06 04:05:06",
+    ]
+
+
+def test_notes_with_line_breaks_are_rejected(database, tmp_path):
+    controller = main.load_controller()
+    path = tmp_path / "import.csv"
+    path.write_text(
+        "type,amount,date_time,category,note\n"
+        "expense,10,2026-01-01 12:00:00,food,one line\n"
+        'expense,20,2026-01-02 12:00:00,food,"line1\nline2"\n'
+    )
+
+    imported, rejected, _ = controller.import_transactions(str(path))
+    assert (imported, rejected) == (1, 1)
+    with pytest.raises(ValueError):
+        controller.save_transaction(**transaction(note="line1\nline2"))
+
+    controller.delete_transaction(f"{1:09d}")
+    assert list(controller.get_all_transactions()) == []
+    assert controller.get_expense() == 0
+
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import main
+from presentation import server
+
+
+def request(controller, *raw_requests):
+    """
+    Send each raw request on its own connection to a Server, return the (status, data)
+    of the responses
+    """
+
+    async def send(port, raw):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+        data = json.loads(await reader.readexactly(length))
+        writer.close()
+        return status, data
+
+    async def run():
+        backend = server.Server(controller)
+        listener = await asyncio.start_server(backend.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            responses = [await send(port, raw) for raw in raw_requests]
+        backend.executor.shutdown()
+        return responses
+
+    return asyncio.run(run())
+
+
+def test_malformed_requests_get_400(database):
+    responses = request(
+        main.load_controller(),
+        b"GARBAGE\r\n\r\n",
+        b"POST /transactions HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+        b"POST /transactions HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+    )
+
+    assert [status for status, _ in responses] == [400, 400, 400]
+
+
+def test_plain_end_date_includes_the_whole_day(database):
+    controller = main.load_controller()
+    controller.save_transaction(
+        type="expense",
+        amount="100",
+        date_time="2026-01-15 12:00:00",
+        category="food",
+        note="",
+    )
+
+    [(status, data)] = request(
+        controller,
+        b"GET /stats/expense-by-category?start_date=2026-01-15&end_date=2026-01-15 "
+        b"HTTP/1.1\r\n\r\n",
+    )
+
+    assert status == 200
+    assert data["total"] == 100
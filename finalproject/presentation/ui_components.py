@@ -1,19 +1,33 @@
+import builtins
 import datetime
 import os
 import sys
 
-from rich import print
-from rich.console import Console
-from rich.live import Live
-from rich.table import Table
+# rich takes longer to import than the rest of the program, so it is imported when
+# the first table or message is drawn, not before the prompt shows up
+_console = None
 
-console = Console()  # Module attribute :))
+
+def get_console():
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()  # Module attribute :))
+    return _console
+
+
+def print(*objects, **kwargs):
+    # rich.print (markup, highlighting), importing rich on first use
+    get_console().print(*objects, **kwargs)
 
 
 class TransactionParser:
-    def __init__(self, controller, subcommand, arguments):
+    def __init__(self, controller, subcommand, arguments, output=None):
         self.controller = controller
+        self.output = output or TerminalOutput()
         self.subcommand = subcommand
+        self.raw_arguments = [argument.strip() for argument in arguments]
         self.arguments = normalize(arguments)
 
         if subcommand == "list":
@@ -26,39 +40,69 @@ class TransactionParser:
             self.delete_transaction()
         elif subcommand == "filter":
             self.filter_transaction()
+        elif subcommand == "show":
+            self.show_transaction()
+        elif subcommand == "import":
+            self.import_transaction()
+        elif subcommand == "export":
+            self.export_transaction()
         else:
             raise Exception("Unsupported subcommand")
 
     def list_transaction(self):
-        remain = int(self.arguments[0])
-        if remain <= 0:
+        # Usage: [<number>] [--limit <number>] [--sort <field>] [--desc]
+        #        --page-size <number> [--after <id>]
+        limit = 20
+        sort = None
+        descending = False
+        page_size = None
+        after = None
+        arguments = list(filter(None, self.arguments))
+        for index, arg in enumerate(arguments):
+            match arg:
+                case "--limit":
+                    limit = int(arguments[index + 1])
+                case "--sort":
+                    sort = arguments[index + 1]
+                case "--desc":
+                    descending = True
+                case "--page-size":
+                    page_size = int(arguments[index + 1])
+                case "--after":
+                    after = arguments[index + 1]
+                case _ if arg.isdigit() and index == 0:
+                    limit = int(arg)
+        if limit <= 0 or (page_size is not None and page_size <= 0):
             raise ValueError("Number of transactions to show must be positive")
 
-        # Set up table
-        transaction_table = Table(title="Transaction History")
-        transaction_table.add_column("ID", style="cyan", no_wrap=True)
-        transaction_table.add_column("Type", style="magenta")
-        transaction_table.add_column("Category", style="green")
-        transaction_table.add_column("Amount", justify="right", style="red")
-        transaction_table.add_column("Date Time", style="yellow")
-        transaction_table.add_column("Note", style="white")
-
-        # Show data
-        with Live(transaction_table, console=console, refresh_per_second=4) as live:
-            for transaction in self.controller.get_all_transactions():
-                transaction_table.add_row(
-                    transaction["id"],
-                    transaction["type"],
-                    transaction["category"],
-                    transaction["amount"],
-                    transaction["date_time"],
-                    transaction["note"] if transaction["note"] else "-",
-                )
-                live.update(transaction_table)
-
-                remain -= 1
-                if remain == 0:
-                    break
+        if page_size is not None or after is not None:
+            self.list_page(after, page_size or 50)
+            return
+
+        # Newest first unless sorted by a field
+        if sort is None:
+            transactions = self.controller.get_recent_transactions(limit)
+            title = "Transaction History"
+        else:
+            transactions = self.controller.get_sorted_transactions(
+                sort, limit, descending
+            )
+            title = f"Transactions by {sort}" + (" (descending)" if descending else "")
+
+        # Rendered once, with all its rows
+        self.output.transactions(title, transactions)
+
+    def list_page(self, after, page_size):
+        transactions = self.controller.get_transaction_page(after, page_size)
+
+        if len(transactions) == page_size:
+            caption = (
+                f"Next page: tx list --page-size {page_size} "
+                f"--after {transactions[-1]['id']}"
+            )
+        else:
+            caption = "Last page"
+        self.output.transactions("Transaction History", transactions, caption)
 
     def add_transaction(self):
         # Get user input
@@ -68,7 +112,7 @@ class TransactionParser:
         self.controller.save_transaction(
             type=type, amount=amount, category=category, date_time=date_time, note=note
         )
-        print("Transaction added successfully.")
+        self.output.message("Transaction added successfully.")
 
     def update_transaction(self):
         # Get user input
@@ -90,17 +134,88 @@ class TransactionParser:
 
         # Update transaction
         self.controller.update_transaction(id, **kwargs)
-        print("Transaction updated successfully.")
+        self.output.message("Transaction updated successfully.")
 
     def delete_transaction(self):
         id = self.arguments[0]
         self.controller.delete_transaction(id)
-        print("Transaction deleted successfully.")
+        self.output.message("Transaction deleted successfully.")
+
+    def show_transaction(self):
+        id = self.arguments[0]
+        if (transaction := self.controller.get_transaction(id)) is None:
+            raise ValueError(f"Transaction not found: {id}")
+
+        self.output.transactions(f"Transaction {id}", [transaction])
 
     def filter_transaction(self):
-        fieldname = self.arguments[0].lstrip("-")
-        args = self.arguments[1:]
-        self.controller.filter_by(fieldname, *args)
+        # Options: --<fieldname> <value(s)>, all of them must match
+        options = {}
+        fieldname = None
+        for arg in filter(None, self.arguments):
+            if arg.startswith("--"):
+                fieldname = arg[2:]
+                options[fieldname] = []
+            elif fieldname is None:
+                raise ValueError(f"Unexpected argument: {arg}")
+            else:
+                options[fieldname].append(arg)
+
+        predicates = {}
+        for fieldname, values in options.items():
+            match fieldname:
+                case "category" | "type":
+                    predicates[fieldname] = " ".join(values)
+                case "date" | "date_time":
+                    predicates["start_date"], predicates["end_date"] = date_range(
+                        values
+                    )
+                case "amount":
+                    # <min> [<max>], one value is an exact amount
+                    predicates["min_amount"] = values[0]
+                    predicates["max_amount"] = values[-1]
+                case _:
+                    raise ValueError(f"Not support fieldname: {fieldname}")
+
+        plan = self.controller.filter_transactions(**predicates)
+
+        # Rows are shown as they are found
+        self.output.stream_transactions(
+            "Filtered Transactions",
+            plan,
+            lambda count: f"{count} transactions, {plan.description}",
+        )
+
+    def import_transaction(self):
+        # File paths keep their case
+        path = self.raw_arguments[0]
+        imported, rejected, reject_path = self.controller.import_transactions(path)
+        self.output.message(f"Imported {imported} transactions.")
+        if rejected:
+            self.output.message(f"Rejected {rejected} rows, see {reject_path}")
+
+    def export_transaction(self):
+        # File paths keep their case
+        path = self.raw_arguments[0]
+
+        # Optional values
+        options = {"format": "csv", "from": None, "to": None, "category": None}
+        for index, arg in enumerate(self.arguments):
+            if arg.startswith("--") and arg[2:] in options:
+                options[arg[2:]] = self.arguments[index + 1]
+
+        start_date, end_date = options["from"], options["to"]
+        if end_date is not None:
+            _, end_date = date_range([end_date])
+
+        rows, seconds = self.controller.export_transactions(
+            path, options["format"], start_date, end_date, options["category"]
+        )
+        speed = rows / seconds if seconds > 0 else 0
+        self.output.message(
+            f"Exported {rows} transactions to {path} in {seconds:.2f}s "
+            f"({speed:,.0f} rows/s)."
+        )
 
     def get_transaction_fields(self):
         """
@@ -133,8 +248,9 @@ class TransactionParser:
 
 
 class CategoryParser:
-    def __init__(self, controller, subcommand, arguments):
+    def __init__(self, controller, subcommand, arguments, output=None):
         self.controller = controller
+        self.output = output or TerminalOutput()
         self.subcommand = subcommand
         self.arguments = normalize(arguments)
 
@@ -148,52 +264,263 @@ class CategoryParser:
             raise Exception("Unsupported subcommand")
 
     def list_category(self):
-        for category in self.controller.get_categories():
-            print(f"- {category}")
+        self.output.items(self.controller.get_categories())
 
     def add_category(self):
         category = self.arguments[0]
         self.controller.add_category(category)
-        print(f"Category '{category}' added successfully.")
+        self.output.message(f"Category '{category}' added successfully.")
 
     def remove_category(self):
         category = self.arguments[0]
         self.controller.remove_category(category)
-        print(f"Category '{category}' removed successfully.")
+        self.output.message(f"Category '{category}' removed successfully.")
 
 
 class statisticsParser:
-    def __init__(self, controller, subcommand):
+    def __init__(self, controller, subcommand, arguments=[], output=None):
         self.controller = controller
+        self.output = output or TerminalOutput()
         self.subcommand = subcommand
+        self.arguments = normalize(arguments)
 
-        # Currently only support expense by category
         if subcommand == "expense":
             self.expense_by_category()
         elif subcommand == "income":
-            # Not promised feature :)) give me money first
-            print("Support income by category later")
+            self.income_by_category()
+        elif subcommand in ["monthly", "daily"]:
+            self.by_period(subcommand)
+        elif subcommand == "category-trend":
+            self.category_trend()
+        elif subcommand == "distribution":
+            self.distribution()
+        elif subcommand == "snapshot":
+            self.refresh_snapshot()
         else:
             raise Exception("Unsupported subcommand")
 
     def expense_by_category(self):
-        stats, total = self.controller.stats_expense_by_category()
+        # Optional date range: <start_date> [<end_date>]
+        if self.arguments:
+            start_date, end_date = date_range(self.arguments)
+            stats, total = self.controller.stats_expense_by_category(
+                start_date, end_date
+            )
+            title = f"Expense by Category ({start_date} - {end_date})"
+        else:
+            stats, total = self.controller.stats_expense_by_category()
+            title = "Expense by Category"
+
+        columns = [
+            ("Category", {"style": "cyan"}),
+            ("Amount", {"justify": "right", "style": "red"}),
+            ("Percentage", {"justify": "right", "style": "green"}),
+        ]
+        rows = [
+            [category, str(amount), percentage(amount, total) + "%"]
+            for category, amount in stats.items()
+        ]
+        self.output.table(title, columns, rows)
+
+    def statistics(self):
+        """
+        Return (aggregator, title suffix) for the optional date range in the arguments
+        """
+
+        if self.arguments:
+            start_date, end_date = date_range(self.arguments)
+            return (
+                self.controller.statistics(start_date, end_date),
+                f" ({start_date} - {end_date})",
+            )
+        return self.controller.statistics(), ""
+
+    def income_by_category(self):
+        aggregator, suffix = self.statistics()
+        stats = aggregator.by_category["income"]
+        total = sum(stats.values())
+
+        columns = [
+            ("Category", {"style": "cyan"}),
+            ("Amount", {"justify": "right", "style": "green"}),
+            ("Percentage", {"justify": "right", "style": "green"}),
+        ]
+        rows = [
+            [category, str(amount), percentage(amount, total) + "%"]
+            for category, amount in stats.items()
+        ]
+        self.output.table("Income by Category" + suffix, columns, rows)
+
+    def by_period(self, period):
+        aggregator, suffix = self.statistics()
+        periods = aggregator.monthly if period == "monthly" else aggregator.daily
+
+        columns = [
+            ("Month" if period == "monthly" else "Day", {"style": "cyan"}),
+            ("Income", {"justify": "right", "style": "green"}),
+            ("Expense", {"justify": "right", "style": "red"}),
+            ("Balance", {"justify": "right", "style": "yellow"}),
+        ]
+        rows = []
+        for key in sorted(periods):
+            income, expense = periods[key]["income"], periods[key]["expense"]
+            rows.append([key, str(income), str(expense), str(income - expense)])
+
+        title = f"{period.capitalize()} Income and Expense" + suffix
+        self.output.table(title, columns, rows)
+
+    def category_trend(self):
+        aggregator, suffix = self.statistics()
+        months = sorted(aggregator.monthly)
+
+        columns = [("Category", {"style": "cyan"})]
+        for month in months:
+            columns.append((month, {"justify": "right", "style": "red"}))
+
+        rows = [
+            [category, *(str(trend.get(month, 0)) for month in months)]
+            for category, trend in sorted(aggregator.category_trend.items())
+        ]
+        self.output.table("Expense by Category per Month" + suffix, columns, rows)
+
+    def distribution(self):
+        # Options: [--category <category>] [--type <type>]
+        options = {"category": None, "type": "expense"}
+        for index, arg in enumerate(self.arguments):
+            if arg.startswith("--") and arg[2:] in options:
+                options[arg[2:]] = self.arguments[index + 1]
+        category, type = options["category"], options["type"]
+
+        sketch = self.controller.amount_distribution(category, type)
+        if sketch.count == 0:
+            self.output.message("No transactions.")
+            return
+
+        title = f"{type.capitalize()} Amounts ({category or 'all categories'})"
+        columns = [
+            ("Percentile", {"style": "cyan"}),
+            ("Amount", {"justify": "right", "style": "red"}),
+        ]
+        rows = [
+            [name, f"{sketch.quantile(q):,.0f}"]
+            for name, q in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]
+        ]
+        caption = f"{sketch.count} transactions, ±1% error"
+        self.output.table(title, columns, rows, caption)
+
+        columns = [
+            ("Amount", {"style": "cyan"}),
+            ("Count", {"justify": "right", "style": "red"}),
+            ("Percentage", {"justify": "right", "style": "green"}),
+            ("", {"style": "green"}),
+        ]
+        largest = max(count for _, _, count in sketch.histogram())
+        rows = [
+            [
+                f"{low:,.0f} - {high:,.0f}",
+                str(count),
+                percentage(count, sketch.count) + "%",
+                "█" * round(count / largest * 30),
+            ]
+            for low, high, count in sketch.histogram()
+        ]
+        self.output.table("Histogram", columns, rows)
+
+        # Share of the category in the total expense
+        if category is not None and type == "expense":
+            stats, total = self.controller.stats_expense_by_category()
+            share = percentage(stats.get(category, 0), total)
+            self.output.message(f"{category}: {share}% of the total expense")
+
+    def refresh_snapshot(self):
+        rows = self.controller.refresh_snapshot()
+        self.output.message(f"Snapshot refreshed: {rows} transactions.")
+
+
+class TerminalOutput:
+    """
+    Render the results of the commands in the terminal with rich. Parsers only hand
+    their results to an output, so they can be rendered another way (e.g. JSON lines
+    in script mode)
+    """
+
+    def transactions(self, title, transactions, caption=None):
+        transaction_table = new_transaction_table(title)
+        for transaction in transactions:
+            add_transaction_row(transaction_table, transaction)
+        transaction_table.caption = caption
+        get_console().print(transaction_table)
+
+    def stream_transactions(self, title, transactions, caption):
+        """
+        Add the rows to the table as they are found, caption(<number of rows>) is shown
+        at the end
+        """
 
-        # Set up table
-        stats_table = Table(title="Expense by Category")
-        stats_table.add_column("Category", style="cyan")
-        stats_table.add_column("Amount", justify="right", style="red")
-        stats_table.add_column("Percentage", justify="right", style="green")
+        from rich.live import Live
 
-        # Show data
-        for category, amount in stats.items():
-            percentage = (amount / total * 100) if total > 0 else 0
-            stats_table.add_row(category, str(amount), f"{percentage:.2f}%")
+        transaction_table = new_transaction_table(title)
+        count = 0
+        with Live(transaction_table, console=get_console(), refresh_per_second=4):
+            for transaction in transactions:
+                add_transaction_row(transaction_table, transaction)
+                count += 1
+            transaction_table.caption = caption(count)
 
-        Console().print(stats_table)
+    def table(self, title, columns, rows, caption=None):
+        """
+        columns: [(<header>, <rich column options>), ...], rows: lists of strings
+        """
+
+        from rich.table import Table
+
+        table = Table(title=title, caption=caption)
+        for header, options in columns:
+            table.add_column(header, **options)
+        for row in rows:
+            table.add_row(*row)
+        get_console().print(table)
+
+    def fields(self, fields):
+        width = max(len(name) for name in fields) + 2
+        for name, value in fields.items():
+            print(f"{name + ':':<{width}}{value}")
+
+    def items(self, items):
+        for item in items:
+            print(f"- {item}")
+
+    def message(self, text):
+        print(text)
+
+
+def new_transaction_table(title):
+    from rich.table import Table
+
+    transaction_table = Table(title=title)
+    transaction_table.add_column("ID", style="cyan", no_wrap=True)
+    transaction_table.add_column("Type", style="magenta")
+    transaction_table.add_column("Category", style="green")
+    transaction_table.add_column("Amount", justify="right", style="red")
+    transaction_table.add_column("Date Time", style="yellow")
+    transaction_table.add_column("Note", style="white")
+    return transaction_table
+
+
+def add_transaction_row(transaction_table, transaction):
+    transaction_table.add_row(
+        transaction["id"],
+        transaction["type"],
+        transaction["category"],
+        transaction["amount"],
+        transaction["date_time"],
+        transaction["note"] if transaction["note"] else "-",
+    )
 
 
 def show_welcome():
+    # Plain print, the banner does not wait for rich to import (same for goodbye)
+    print = builtins.print
     print("\n=============================================")
     print("   Finance CLI  v0.1")
     print("   Personal Finance Manager for Developers")
@@ -209,17 +536,29 @@ def show_help():
 =====================
 
 🔹 transaction (tx) <subcommand> [options]  → Manage transactions
-    Subcommands:")
-      • list <number>")
-          List recent transactions")
+    Subcommands:
+      • list [<number>] [--sort amount|date_time] [--desc] [--limit <number>]
+        list --page-size <number> [--after <id>]
+          List the most recent transactions (20 by default), the first ones
+          sorted by a field, or all of them page by page (from the first one
+          or after an id)
       • add -t <type> -a <amount> -c <category> [-d <date>] [-n <note>]
-          Add a new transaction")
+          Add a new transaction
       • update <id> [-t <type>] [-a <amount>] [-c <category>] [-d <date>] [-n <note>]
           Update an existing transaction
       • delete <id>
           Delete a transaction
-      • filter --<fieldname> <value(s)>
-          Filter transactions by field (type, category, date_time, amount, note)
+      • show <id>
+          Show a single transaction
+      • import <file.csv>
+          Import transactions (columns: type, amount, date_time, category, note),
+          invalid rows are reported in <file>.rejects.csv
+      • export <file> [--format csv|jsonl|parquet] [--from <date>] [--to <date>]
+               [--category <category>]
+          Export transactions (parquet requires pyarrow)
+      • filter [--category <category>] [--type <type>]
+               [--date <start_date> [<end_date>]] [--amount <min> [<max>]]
+          Filter transactions, all the given fields must match
 
 🔹 category (cat) <subcommand> [options]   → Manage categories
     Subcommands:
@@ -234,8 +573,18 @@ def show_help():
 
 🔹 statistics (stats) <subcommand>         → Show financial statistics
     Subcommands:
-      • expense
-          Show expense breakdown by category
+      • expense [<start_date> [<end_date>]]
+          Show expense breakdown by category (optionally in a date range)
+      • income [<start_date> [<end_date>]]
+          Show income breakdown by category
+      • monthly | daily [<start_date> [<end_date>]]
+          Show income, expense and balance per month or per day
+      • category-trend [<start_date> [<end_date>]]
+          Show the expense of each category per month
+      • distribution [--category <category>] [--type <type>]
+          Show p50/p90/p99 and a histogram of the amounts (expense by default)
+      • snapshot
+          Refresh the columnar snapshot used by statistics (requires NumPy)
 
 🔹 help                                    → Show this help message
 🔹 clear                                   → Clear the console screen
@@ -245,25 +594,85 @@ def show_help():
 
 
 def show_goodbye():
+    print = builtins.print
     print("\n==============================================")
     print("Thanks for using Finance CLI")
     print("Code hard 💻 • Spend smart 💰 • Save more 📈")
     print("==============================================\n")
 
 
-def show_finance(controller):
-    income = controller.get_income()
-    expense = controller.get_expense()
-    balance = controller.get_balance()
-    print(f"Income:  {income}")
-    print(f"Expense: {expense}")
-    print(f"Balance: {balance}")
+def show_finance(controller, output=None):
+    output = output or TerminalOutput()
+    output.fields(
+        {
+            "Income": controller.get_income(),
+            "Expense": controller.get_expense(),
+            "Balance": controller.get_balance(),
+        }
+    )
 
 
 def normalize(a_list):
     return [element.lower().strip() for element in a_list]
 
 
+def percentage(amount, total, decimals=2):
+    per = (amount / total * 100) if total > 0 else 0
+    return f"{per:.{decimals}f}"
+
+
+def date_range(arguments):
+    """
+    Return (start_date, end_date) from [<start_date>, <end_date>] or [<date>]. A plain
+    date (YYYY-MM-DD) as end date includes the whole day
+    """
+
+    start_date = arguments[0]
+    end_date = arguments[1] if len(arguments) > 1 else arguments[0]
+    if len(end_date) == len("YYYY-MM-DD"):
+        end_date += " 23:59:59"
+    return start_date, end_date
+
+
+# Commands run by run_command (the others only make sense at the prompt)
+COMMANDS = [
+    "transaction",
+    "tx",
+    "category",
+    "cat",
+    "balance",
+    "bal",
+    "statistics",
+    "stats",
+]
+
+
+def split_command(user_command):
+    """
+    Return (command, subcommand, arguments) of a command line. Arguments are normalized
+    by the parsers (file paths keep their case)
+    """
+
+    parts = user_command.strip().split(" ")
+    command = parts[0].lower()
+    subcommand = parts[1].lower() if len(parts) > 1 else ""
+    arguments = parts[2:] if len(parts) > 2 else []
+    return command, subcommand, arguments
+
+
+def run_command(controller, command, subcommand, arguments, output=None):
+    if command in ["transaction", "tx"]:
+        TransactionParser(controller, subcommand, arguments, output)
+    elif command in ["category", "cat"]:
+        CategoryParser(controller, subcommand, arguments, output)
+    elif command in ["balance", "bal"]:
+        show_finance(controller, output)
+    elif command in ["statistics", "stats"]:
+        statisticsParser(controller, subcommand, arguments, output)
+    else:
+        raise ValueError(f"Unknown command: {command}")
+
+
 def run_application(controller):
     """
     Exception handling strategy:
@@ -274,30 +683,13 @@ def run_application(controller):
 
     show_welcome()
     while True:
-        user_command = input("fincli> ").strip().lower()
-        parts = user_command.split(" ")
-        command = parts[0]
-        subcommand = parts[1] if len(parts) > 1 else ""
-        arguments = parts[2:] if len(parts) > 2 else []
-
-        if command in ["transaction", "tx"]:
-            try:
-                TransactionParser(controller, subcommand, arguments)
-            except Exception as e:
-                print(f"Error {e}")
-
-        elif command in ["category", "cat"]:
-            try:
-                CategoryParser(controller, subcommand, arguments)
-            except Exception as e:
-                print(f"Error {e}")
-
-        elif command in ["balance", "bal"]:
-            show_finance(controller)
+        command, subcommand, arguments = split_command(input("fincli> "))
 
-        elif command in ["statistics", "stats"]:
+        if command in COMMANDS:
             try:
-                statisticsParser(controller, subcommand)
+                # Pick up the writes of other processes sharing the database
+                controller.refresh()
+                run_command(controller, command, subcommand, arguments)
             except Exception as e:
                 print(f"Error {e}")
 